@@ -1,7 +1,11 @@
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update, insert, Select, Row
 from sqlalchemy.ext.asyncio import AsyncSession
-from .db import User, Tournament, Team, Player, UserRole
+from .db import User, Tournament, Team, Player, UserRole, OutboxMessage, TeamStatus, TournamentStatus
 from sqlalchemy import func
+from typing import NamedTuple
+from app.services.user_cache import user_cache
+from app.services import stats
+from collections import Counter
 
 async def get_user(session: AsyncSession, tg_id: int) -> User | None:
     return await session.scalar(select(User).where(User.telegram_id == tg_id))
@@ -10,42 +14,223 @@ async def create_user(session: AsyncSession, tg_id: int, full_name: str, usernam
     user = User(telegram_id=tg_id, full_name=full_name, username=username)
     session.add(user)
     await session.commit()
+    user_cache.invalidate(tg_id)
     return user
 
+async def resolve_usernames(session: AsyncSession, usernames: list[str]) -> tuple[list[int], list[str]]:
+    """telegram_id по списку юзернеймов одним запросом (без учёта регистра).
+
+    Возвращает (найденные telegram_id в порядке ввода, ненайденные юзернеймы).
+    """
+    unique = list(dict.fromkeys(name.lower() for name in usernames))
+    if not unique:
+        return [], []
+    rows = await session.execute(
+        select(func.lower(User.username), User.telegram_id)
+        .where(func.lower(User.username).in_(unique))
+    )
+    found = dict(rows.all())
+    missing = [name for name in dict.fromkeys(usernames) if name.lower() not in found]
+    return [found[name] for name in unique if name in found], missing
+
+def add_notification(session: AsyncSession, chat_id: int, text: str, reply_markup=None) -> None:
+    """Запись уведомления в outbox. Отправится после коммита вызывающего кода"""
+    session.add(OutboxMessage(
+        chat_id=chat_id,
+        text=text,
+        reply_markup=reply_markup.model_dump_json(exclude_none=True) if reply_markup else None
+    ))
+    session.info["outbox_dirty"] = True
+
 async def create_tournament(session: AsyncSession, data: dict) -> Tournament:
     tournament = Tournament(**data)
     session.add(tournament)
     await session.commit()
     return tournament
 
+def mark_tournaments_changed(session: AsyncSession, format_id: int) -> None:
+    """Сбросить кэш страниц турниров формата после коммита (одобрен, включён/выключен, удалён)"""
+    session.info.setdefault("tournament_formats", set()).add(format_id)
+
 async def delete_tournament(session: AsyncSession, tournament_id: int) -> None:
-    await session.execute(delete(Tournament).where(Tournament.id == tournament_id))
-    await session.commit()
+    # Через ORM, чтобы каскадно удалить команды и игроков (foreign_keys=ON в SQLite)
+    tournament = await session.get(Tournament, tournament_id)
+    if tournament:
+        await session.delete(tournament)
+        mark_tournaments_changed(session, tournament.format_id)
+        await session.commit()
+
+class TeamCard(NamedTuple):
+    """Данные для карточки команды"""
+    team: Team
+    tournament: Tournament | None
+    captain: User | None
+    player_names: list[str]
+
+    @property
+    def captain_info(self) -> str:
+        if self.captain and self.captain.username:
+            return f"@{self.captain.username}"
+        if self.captain and self.captain.full_name:
+            return self.captain.full_name
+        return str(self.team.captain_tg_id)
+
+async def get_team_card(session: AsyncSession, team_id: int) -> TeamCard | None:
+    """Команда, турнир, капитан и участники — два запроса при любом размере состава"""
+    row = (await session.execute(
+        select(Team, Tournament, User)
+        .outerjoin(Tournament, Tournament.id == Team.tournament_id)
+        .outerjoin(User, User.telegram_id == Team.captain_tg_id)
+        .where(Team.id == team_id)
+    )).first()
+    if row is None:
+        return None
+    team, tournament, captain = row
+    # Игрок мог ещё не написать боту — тогда показываем его ID
+    players = await session.execute(
+        select(User.username, Player.user_id)
+        .select_from(Player)
+        .outerjoin(User, User.telegram_id == Player.user_id)
+        .where(Player.team_id == team_id)
+        .order_by(Player.id)
+    )
+    player_names = [f"@{username or user_id}" for username, user_id in players]
+    return TeamCard(team, tournament, captain, player_names)
+
+async def compare_and_set(session: AsyncSession, model, obj_id: int, field: str, expected, value, *conditions):
+    """Атомарно: UPDATE ... SET field = value WHERE id = obj_id AND field = expected RETURNING *.
+
+    Возвращает обновлённый объект или None, если строки нет, значение уже
+    изменено кем-то другим или не выполнены дополнительные условия.
+    Коммит делает вызывающий код.
+    """
+    column = getattr(model, field)
+    obj = await session.scalar(
+        update(model)
+        .where(model.id == obj_id, column == expected, *conditions)
+        .values({field: value})
+        .returning(model)
+    )
+    if obj is not None:
+        # UPDATE в обход ORM — счётчики статистики обновляем явно, в той же транзакции
+        await stats.bump(session, stats.field_change_deltas(obj, field, expected, value))
+    return obj
+
+async def transition_status(
+    session: AsyncSession,
+    model,
+    obj_id: int,
+    new_status: TeamStatus | TournamentStatus,
+    expected=None
+):
+    """Переход статуса команды/турнира (по умолчанию только из PENDING)"""
+    if expected is None:
+        expected = TeamStatus.PENDING if model is Team else TournamentStatus.PENDING
+    return await compare_and_set(session, model, obj_id, "status", expected, new_status)
+
+async def bulk_set_team_status(
+    session: AsyncSession,
+    new_status: TeamStatus,
+    team_ids: list[int] | None = None,
+    tournament_id: int | None = None,
+    created_by: int | None = None
+) -> list[tuple[int, int, str]]:
+    """Смена статуса заявок одним UPDATE (только для ещё не обработанных).
 
-async def create_team(session: AsyncSession, data: dict) -> Team:
+    created_by ограничивает турнирами конкретного админа.
+    Возвращает [(team_id, captain_tg_id, team_name), ...]; коммит делает вызывающий код.
+    """
+    stmt = update(Team).where(Team.status == TeamStatus.PENDING)
+    if team_ids is not None:
+        stmt = stmt.where(Team.id.in_(team_ids))
+    if tournament_id is not None:
+        stmt = stmt.where(Team.tournament_id == tournament_id)
+    if created_by is not None:
+        stmt = stmt.where(Team.tournament_id.in_(
+            select(Tournament.id).where(Tournament.created_by == created_by)
+        ))
+    result = (await session.execute(
+        stmt.values(status=new_status)
+        .returning(Team.id, Team.captain_tg_id, Team.team_name, Team.tournament_id)
+        .execution_options(synchronize_session=False)
+    )).all()
+    deltas = Counter()
+    for *_, tournament_id in result:
+        deltas.update(stats.change_deltas(
+            stats.team_keys(TeamStatus.PENDING, tournament_id),
+            stats.team_keys(new_status, tournament_id)
+        ))
+    await stats.bump(session, deltas)
+    return [(team_id, captain_tg_id, team_name) for team_id, captain_tg_id, team_name, _ in result]
+
+async def register_team(session: AsyncSession, data: dict, players: list[int]) -> Team:
+    """Команда и весь состав в одной транзакции (игроки — одним INSERT).
+
+    Коммит делает вызывающий код, чтобы в ту же транзакцию попали уведомления.
+    """
     team = Team(**data)
     session.add(team)
-    await session.commit()
+    await session.flush()  # нужен team.id
+    if players:
+        await session.execute(
+            insert(Player),
+            [{"team_id": team.id, "user_id": user_id, "is_substitute": False} for user_id in players]
+        )
     return team
 
-async def add_players_to_team(session: AsyncSession, team_id: int, players: list[int], is_substitute: bool = False):
-    for user_id in players:
-        player = Player(team_id=team_id, user_id=user_id, is_substitute=is_substitute)
-        session.add(player)
-    await session.commit()
+async def update_team_roster(session: AsyncSession, team_id: int, players: list[int]) -> tuple[int, int]:
+    """Замена состава по разнице: удаляются только выбывшие, добавляются только новые.
+
+    Возвращает (добавлено, удалено); коммит делает вызывающий код.
+    """
+    current = set(await session.scalars(select(Player.user_id).where(Player.team_id == team_id)))
+    wanted = list(dict.fromkeys(players))
+    removed = current - set(wanted)
+    added = [user_id for user_id in wanted if user_id not in current]
+    if removed:
+        await session.execute(
+            delete(Player).where(Player.team_id == team_id, Player.user_id.in_(removed))
+        )
+    if added:
+        await session.execute(
+            insert(Player),
+            [{"team_id": team_id, "user_id": user_id, "is_substitute": False} for user_id in added]
+        )
+    return len(added), len(removed)
     
+PAGE_SIZE = 20
+
+class KeysetPage(NamedTuple):
+    """Страница keyset-пагинации (строки по возрастанию ключа)"""
+    rows: list[Row]
+    has_prev: bool
+    has_next: bool
+
+async def keyset_page(
+    session: AsyncSession,
+    stmt: Select,
+    key,
+    after=None,
+    before=None,
+    limit: int = PAGE_SIZE
+) -> KeysetPage:
+    """Keyset-пагинация по возрастанию key: страница после after или перед before"""
+    if before is not None:
+        rows = (await session.execute(stmt.where(key < before).order_by(key.desc()).limit(limit + 1))).all()
+        return KeysetPage(rows[:limit][::-1], len(rows) > limit, True)
+    if after is not None:
+        stmt = stmt.where(key > after)
+    rows = (await session.execute(stmt.order_by(key).limit(limit + 1))).all()
+    return KeysetPage(rows[:limit], after is not None, len(rows) > limit)
+
 async def get_statistics(session: AsyncSession) -> dict:
-    """Сбор статистики"""
-    users_count = await session.scalar(select(func.count(User.id)))
-    active_tournaments = await session.scalar(
-        select(func.count(Tournament.id))
-        .where(Tournament.is_active == True)
-    )
-    teams_count = await session.scalar(select(func.count(Team.id)))
+    """Сбор статистики из счётчиков stat_counters (один запрос)"""
+    counters = await stats.read_overview(session)
     return {
-        "users": users_count,
-        "active_tournaments": active_tournaments,
-        "teams": teams_count
+        "users": counters.get("users", 0),
+        "active_tournaments": counters.get("tournaments:active", 0),
+        "teams": counters.get("teams", 0),
+        "counters": counters
     }
     
 async def update_user_role(
@@ -55,10 +240,11 @@ async def update_user_role(
 ) -> bool:
     """Обновление роли пользователя по юзернейму"""
     user = await session.scalar(
-        select(User).where(User.username == username))
+        select(User).where(func.lower(User.username) == username.lower()))
     
     if not user:
         return False
     user.role = new_role
     await session.commit()
+    user_cache.invalidate(user.telegram_id)
     return True
\ No newline at end of file
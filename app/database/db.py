@@ -1,19 +1,64 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, String, Text , BigInteger
+from sqlalchemy import ForeignKey, String, Text , BigInteger, Index, func, event
 from datetime import datetime
 from typing import Optional, List
 from enum import Enum
+from dotenv import load_dotenv
 
+import asyncio
 import os
+import logging
+
+load_dotenv()
+logger = logging.getLogger(__name__)
 
 class Base(DeclarativeBase):
     pass
 
 DATABASE_URL = os.getenv("DB_URL", "sqlite+aiosqlite:///./admin.db")
-engine = create_async_engine(DATABASE_URL)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Профиль SQLite: применяется к каждому новому соединению
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("DB_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "5000")),  # мс
+    "mmap_size": int(os.getenv("DB_SQLITE_MMAP_SIZE", str(64 * 1024 * 1024))),  # байт
+    "cache_size": int(os.getenv("DB_SQLITE_CACHE_SIZE", "-16000")),  # < 0 — в КиБ
+    "foreign_keys": os.getenv("DB_SQLITE_FOREIGN_KEYS", "ON"),
+}
+
+# Пул для серверных БД (DB_URL=postgresql+asyncpg://...)
+SERVER_POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+}
+
+# Как часто обновлять статистику планировщика SQLite, с (0 — только при остановке)
+DB_OPTIMIZE_INTERVAL = float(os.getenv("DB_OPTIMIZE_INTERVAL", "21600"))
+
+def _engine_options() -> dict:
+    if IS_SQLITE:
+        # timeout драйвера — запасной вариант к PRAGMA busy_timeout
+        return {"connect_args": {"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}}
+    return SERVER_POOL_OPTIONS
+
+engine = create_async_engine(DATABASE_URL, **_engine_options())
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+if IS_SQLITE:
+    event.listen(engine.sync_engine, "connect", apply_sqlite_pragmas)
+
 class UserRole(str, Enum):
     USER = "user"
     ADMIN = "admin"
@@ -29,6 +74,14 @@ class TeamStatus(str, Enum):
     APPROVED = "approved"
     REJECTED = "rejected"
 
+class BroadcastStatus(str, Enum):
+    RUNNING = "running"
+    DONE = "done"
+
+class OutboxStatus(str, Enum):
+    PENDING = "pending"
+    DEAD = "dead"  # доставить не удалось, нужна ручная проверка
+
 class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -39,6 +92,11 @@ class User(Base):
     role: Mapped[UserRole] = mapped_column(default=UserRole.USER)
     added_by: Mapped[Optional[int]] = mapped_column(BigInteger)
 
+# Поиск по юзернейму без учёта регистра (ввод состава команды, назначение админов)
+Index("ix_users_username_lower", func.lower(User.username))
+# Списки админов и супер-админов
+Index("ix_users_role", User.role)
+
 
 
 class GameFormat(Base):
@@ -63,9 +121,11 @@ class Tournament(Base):
     format_id: Mapped[int] = mapped_column(ForeignKey("game_formats.id"), index=True)
     name: Mapped[str] = mapped_column(String(100))
     logo_path: Mapped[str] = mapped_column(String(200))
+    logo_file_id: Mapped[Optional[str]] = mapped_column(String(200))  # file_id в Telegram
     start_date: Mapped[datetime]
     description: Mapped[str] = mapped_column(Text)
     regulations_path: Mapped[str] = mapped_column(String(200))
+    regulations_file_id: Mapped[Optional[str]] = mapped_column(String(200))
     is_active: Mapped[bool] = mapped_column(default=True)
     game: Mapped["Game"] = relationship(back_populates="tournaments")
     format: Mapped["GameFormat"] = relationship()
@@ -73,8 +133,11 @@ class Tournament(Base):
     status: Mapped[TournamentStatus] = mapped_column(default=TournamentStatus.PENDING)
     created_by: Mapped[int] = mapped_column(BigInteger)  # ID создателя
 
-
-
+# Турниры формата: активные и одобренные, по порядку id
+Index("ix_tournaments_format_active_status", Tournament.format_id, Tournament.is_active, Tournament.status, Tournament.id)
+# Списки турниров в админ-панели (фильтр по статусу, турниры админа)
+Index("ix_tournaments_status", Tournament.status)
+Index("ix_tournaments_created_by_status", Tournament.created_by, Tournament.status)
 
 class Team(Base):
     __tablename__ = "teams"
@@ -83,12 +146,18 @@ class Team(Base):
     captain_tg_id: Mapped[int] = mapped_column(BigInteger, index=True)
     team_name: Mapped[str] = mapped_column(String(50))
     logo_path: Mapped[str] = mapped_column(String(200))
+    logo_file_id: Mapped[Optional[str]] = mapped_column(String(200))
     status: Mapped[TeamStatus] = mapped_column(default=TeamStatus.PENDING)  # <--- добавьте это поле
     tournament: Mapped["Tournament"] = relationship(back_populates="teams")
     players: Mapped[List["Player"]] = relationship(
         back_populates="team",
         cascade="all, delete-orphan"
     )
+
+# Заявки на модерации и команды турнира по статусу
+Index("ix_teams_status", Team.status)
+Index("ix_teams_tournament_status", Team.tournament_id, Team.status)
+
 class Player(Base):
     __tablename__ = "players"
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -96,9 +165,115 @@ class Player(Base):
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
     is_substitute: Mapped[bool] = mapped_column(default=False)
     team: Mapped["Team"] = relationship(back_populates="players")
+
+
+class MediaFile(Base):
+    """Локальные копии файлов Telegram (по file_unique_id) со счётчиком ссылок"""
+    __tablename__ = "media_files"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    file_unique_id: Mapped[str] = mapped_column(String(100), unique=True, index=True)
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), index=True)  # sha256
+    path: Mapped[str] = mapped_column(String(200), index=True)
+    ref_count: Mapped[int] = mapped_column(default=1)
+
+
+class PendingMedia(Base):
+    """Файлы режима deferred: file_unique_id для дедупликации и попытки докачки"""
+    __tablename__ = "pending_media"
+    file_id: Mapped[str] = mapped_column(String(200), primary_key=True)
+    file_unique_id: Mapped[Optional[str]] = mapped_column(String(100))
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[Optional[datetime]]  # раньше не пытаться (экспоненциальная пауза)
+    failed: Mapped[bool] = mapped_column(default=False)  # скачать невозможно, больше не пытаться
+    last_error: Mapped[Optional[str]] = mapped_column(String(200))
+
+
+class OutboxMessage(Base):
+    """Уведомления, записанные в той же транзакции, что и изменение статуса"""
+    __tablename__ = "outbox"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    text: Mapped[str] = mapped_column(Text)
+    reply_markup: Mapped[Optional[str]] = mapped_column(Text)  # JSON клавиатуры
+    status: Mapped[OutboxStatus] = mapped_column(default=OutboxStatus.PENDING, index=True)
+    attempts: Mapped[int] = mapped_column(default=0)
+    last_error: Mapped[Optional[str]] = mapped_column(String(200))
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+
+
+class Broadcast(Base):
+    """Рассылка участникам турнира; cursor позволяет продолжить после перезапуска"""
+    __tablename__ = "broadcasts"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    tournament_id: Mapped[int] = mapped_column(index=True)  # без FK: журнал переживает удаление турнира
+    admin_chat_id: Mapped[int] = mapped_column(BigInteger)
+    progress_message_id: Mapped[Optional[int]]
+    text: Mapped[str] = mapped_column(Text)
+    status: Mapped[BroadcastStatus] = mapped_column(default=BroadcastStatus.RUNNING, index=True)
+    cursor: Mapped[int] = mapped_column(BigInteger, default=0)  # последний обработанный telegram_id
+    sent: Mapped[int] = mapped_column(default=0)
+    failed: Mapped[int] = mapped_column(default=0)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+
+
+class StatCounter(Base):
+    """Счётчики статистики, обновляются в тех же транзакциях, что и данные"""
+    __tablename__ = "stat_counters"
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)  # например "teams:approved"
+    value: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class ChannelMember(Base):
+    """Индекс подписок на обязательные каналы (из апдейтов chat_member)"""
+    __tablename__ = "channel_members"
+    channel: Mapped[str] = mapped_column(String(64), primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    is_member: Mapped[bool]
+    updated_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, onupdate=datetime.utcnow)
     
 
 
+async def log_engine_settings():
+    """Вывод фактических настроек БД при старте"""
+    if not IS_SQLITE:
+        logger.info(f"Database {engine.url.get_backend_name()}: {SERVER_POOL_OPTIONS}")
+        return
+    effective = {}
+    async with engine.connect() as conn:
+        for name in SQLITE_PRAGMAS:
+            effective[name] = (await conn.exec_driver_sql(f"PRAGMA {name}")).scalar()
+    logger.info(f"SQLite settings: {effective}")
+
+
+async def optimize_database():
+    """Статистика планировщика SQLite по текущим данным.
+
+    ANALYZE с analysis_limit читает ограниченное число строк каждого индекса,
+    поэтому дёшев и на большой базе; PRAGMA optimize на старых версиях SQLite
+    на свежем соединении ничего не делает.
+    """
+    if not IS_SQLITE:
+        return
+    async with engine.connect() as conn:
+        await conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+        await conn.exec_driver_sql("ANALYZE")
+        await conn.commit()
+    logger.info("SQLite planner statistics refreshed")
+
+
+async def run_db_optimizer():
+    """Периодическое обновление статистики, чтобы она не отставала от роста таблиц"""
+    while True:
+        await asyncio.sleep(DB_OPTIMIZE_INTERVAL)
+        try:
+            await optimize_database()
+        except Exception as e:
+            logger.warning(f"Planner statistics refresh failed: {e!r}")
+
+
 async def create_db():
+    from app.database.migrations import run_migrations
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+    await log_engine_settings()
\ No newline at end of file
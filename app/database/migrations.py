@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import sys
+import warnings
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text, insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError, SAWarning
+from sqlalchemy.schema import CreateIndex
+from app.database.db import Base, User, UserRole, Team, TeamStatus, Tournament, TournamentStatus, engine
+from app.services.stats import recompute_counters
+
+logger = logging.getLogger(__name__)
+
+# Отдельные метаданные: таблица версий не должна попадать в Base.metadata
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100)),
+    Column("applied_at", DateTime),
+)
+
+
+def _existing_indexes(conn: Connection, table_name: str) -> set[str]:
+    with warnings.catch_warnings():
+        # Индексы по выражениям инспектор пропускает с предупреждением
+        warnings.filterwarnings("ignore", "Skipped unsupported reflection of expression-based index", SAWarning)
+        names = {index["name"] for index in inspect(conn).get_indexes(table_name)}
+    if conn.dialect.name == "sqlite":
+        # Инспектор SQLite не возвращает индексы по выражениям (lower(username))
+        names.update(conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+            {"table": table_name}
+        ).scalars())
+    return names
+
+
+def _create_indexes(conn: Connection, *names: str) -> None:
+    """Создание индексов, объявленных в моделях, если их ещё нет"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in names:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def _baseline(conn: Connection) -> None:
+    """Базы, созданные до появления миграций: новые nullable-колонки и индексы моделей"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        existing_indexes = _existing_indexes(conn, table.name)
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(conn)
+
+
+def _query_indexes(conn: Connection) -> None:
+    _create_indexes(
+        conn,
+        "ix_users_username_lower",
+        "ix_users_role",
+        "ix_teams_status",
+        "ix_teams_tournament_status",
+        "ix_tournaments_format_active_status",
+    )
+
+
+def _admin_list_indexes(conn: Connection) -> None:
+    _create_indexes(conn, "ix_tournaments_status", "ix_tournaments_created_by_status")
+
+
+def _stat_counters(conn: Connection) -> None:
+    """Таблицу создаёт create_all; заполняем счётчики по текущим данным"""
+    recompute_counters(conn)
+
+
+# (версия, название, функция) — только добавлять в конец, не менять применённые
+MIGRATIONS = [
+    (1, "baseline", _baseline),
+    (2, "indexes for hot queries", _query_indexes),
+    (3, "indexes for admin lists", _admin_list_indexes),
+    (4, "statistics counters", _stat_counters),
+]
+
+
+def run_migrations(conn: Connection) -> None:
+    """Применение недостающих миграций (вызывается после create_all)"""
+    schema_version.create(conn, checkfirst=True)
+    current = conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    for version, name, upgrade in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info(f"Applying migration {version}: {name}")
+        upgrade(conn)
+        conn.execute(insert(schema_version).values(version=version, name=name, applied_at=datetime.utcnow()))
+
+
+# Основные запросы и индекс, который они должны использовать
+QUERY_PLAN_CHECKS = [
+    (
+        "roster usernames",
+        select(User.telegram_id).where(func.lower(User.username).in_(["user1", "user2"])),
+        "ix_users_username_lower",
+    ),
+    (
+        "super admins",
+        select(User.telegram_id).where(User.role == UserRole.SUPER_ADMIN),
+        "ix_users_role",
+    ),
+    (
+        "pending teams",
+        select(Team.id).where(Team.status == TeamStatus.PENDING),
+        "ix_teams_status",
+    ),
+    (
+        "tournament participants",
+        select(Team.captain_tg_id).where(Team.tournament_id == 1, Team.status == TeamStatus.APPROVED),
+        "ix_teams_tournament_status",
+    ),
+    (
+        "tournaments by format",
+        select(Tournament.id, Tournament.name)
+        .where(Tournament.format_id == 1, Tournament.is_active == True, Tournament.status == TournamentStatus.APPROVED)
+        .order_by(Tournament.id),
+        "ix_tournaments_format_active_status",
+    ),
+    (
+        "tournaments by status (admin list)",
+        select(Tournament.id, Tournament.name)
+        .where(Tournament.status == TournamentStatus.PENDING, Tournament.id > 100)
+        .order_by(Tournament.id),
+        "ix_tournaments_status",
+    ),
+    (
+        "own tournaments (admin list)",
+        select(Tournament.id, Tournament.name)
+        .where(Tournament.created_by == 1, Tournament.status == TournamentStatus.APPROVED)
+        .order_by(Tournament.id),
+        "ix_tournaments_created_by_status",
+    ),
+]
+
+
+def _plan(conn: Connection, stmt, index_name: str) -> str:
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        # INDEXED BY: проверяем, что индекс применим, а не что выберет
+        # планировщик при текущей статистике (на маленьких таблицах — SCAN)
+        table = stmt.get_final_froms()[0].name
+        sql = sql.replace(f"FROM {table}", f"FROM {table} INDEXED BY {index_name}", 1)
+        return "\n".join(str(row[-1]) for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+    return "\n".join(str(row[-1]) for row in conn.exec_driver_sql("EXPLAIN " + sql))
+
+
+def check_query_plans(conn: Connection) -> list[str]:
+    """Запросы, для которых ожидаемый индекс неприменим"""
+    if conn.dialect.name == "postgresql":
+        # На маленьких таблицах PostgreSQL честно выбирает seq scan — проверяем, что индекс применим
+        conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    failed = []
+    for name, stmt, index_name in QUERY_PLAN_CHECKS:
+        try:
+            plan = _plan(conn, stmt, index_name)
+        except OperationalError as e:
+            # SQLite: "no query solution" — запрос не может использовать индекс
+            plan = str(e.orig)
+        # SQLite с INDEXED BY может пройти индекс целиком (SCAN) — нужен поиск (SEARCH)
+        used = any(
+            index_name in line and (conn.dialect.name != "sqlite" or "SEARCH" in line)
+            for line in plan.splitlines()
+        )
+        if used:
+            logger.info(f"{name}: uses {index_name}")
+        else:
+            logger.warning(f"{name}: {index_name} is not used\n{plan}")
+            failed.append(name)
+    return failed
+
+
+async def _main(argv: list[str]) -> int:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+        if "--check" not in argv:
+            return 0
+        failed = await conn.run_sync(check_query_plans)
+    if failed:
+        print(f"Queries without expected index: {', '.join(failed)}")
+        return 1
+    print("All checked queries use their indexes")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
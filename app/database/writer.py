@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, TypeVar
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from app.database.db import DATABASE_URL, IS_SQLITE, async_session_maker, apply_sqlite_pragmas, _engine_options
+from app.services import metrics
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Включение группового коммита (по умолчанию каждый обработчик коммитит сам)
+DB_WRITE_COALESCING = os.getenv("DB_WRITE_COALESCING", "0") == "1"
+# Сколько ждать соседние записи после первой в пачке, с
+DB_WRITE_WINDOW = float(os.getenv("DB_WRITE_WINDOW", "0.005"))
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "100"))
+
+T = TypeVar("T")
+WriteJob = Callable[[AsyncSession], Awaitable[T]]
+
+
+def _writer_session_maker() -> async_sessionmaker:
+    if not IS_SQLITE:
+        return async_session_maker
+    # Отдельное соединение писателя: драйвер sqlite3 сам управляет транзакциями
+    # и ломает SAVEPOINT, поэтому BEGIN выдаём явно. IMMEDIATE сразу берёт
+    # блокировку записи, и пачка не упирается в чужого писателя посреди работы.
+    writer_engine = create_async_engine(DATABASE_URL, **_engine_options())
+
+    @event.listens_for(writer_engine.sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        apply_sqlite_pragmas(dbapi_connection, connection_record)
+
+    @event.listens_for(writer_engine.sync_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return async_sessionmaker(writer_engine, expire_on_commit=False)
+
+
+@dataclass
+class _Write:
+    job: WriteJob
+    future: asyncio.Future
+    result: object = None
+    error: BaseException | None = None
+
+
+class WriteCoalescer:
+    """Один фоновый писатель: короткие записи разных обработчиков — одним коммитом.
+
+    Каждая запись выполняется в своём SAVEPOINT, поэтому ошибка одной не
+    откатывает остальные. Задача получает сессию и не коммитит сама; её можно
+    выполнить повторно (если общий коммит не удался), поэтому объекты она
+    создаёт внутри себя.
+    """
+
+    def __init__(self, enabled: bool, window: float, batch_size: int):
+        self.enabled = enabled
+        self.window = window
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue[_Write] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._session_maker: async_sessionmaker | None = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        self._session_maker = _writer_session_maker()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Write coalescing enabled: window {self.window}s, batch {self.batch_size}")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run(self, session: AsyncSession, job: WriteJob) -> T:
+        """Выполнение записи и коммит; результат или исключение — только этого вызова.
+
+        Без группового коммита задача выполняется в сессии обработчика.
+        """
+        if self._task is None:
+            result = await job(session)
+            await session.commit()
+            return result
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Write(job, future))
+        return await future
+
+    async def _collect(self) -> list[_Write]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                logger.error(f"Write batch failed: {e}", exc_info=True)
+                for write in batch:
+                    if write.error is None:
+                        write.error = e
+            for write in batch:
+                if write.future.done():
+                    continue  # вызывающий уже отменён
+                if write.error is not None:
+                    write.future.set_exception(write.error)
+                else:
+                    write.future.set_result(write.result)
+
+    async def _commit_batch(self, batch: list[_Write]) -> None:
+        started = time.monotonic()
+        async with self._session_maker() as session:
+            for write in batch:
+                try:
+                    async with session.begin_nested():
+                        write.result = await write.job(session)
+                except Exception as e:
+                    write.error = e
+            try:
+                await session.commit()
+            except Exception as e:
+                logger.warning(f"Group commit of {len(batch)} writes failed, retrying one by one: {e!r}")
+                await session.rollback()
+                metrics.inc("db_write_group_fallbacks")
+                await self._commit_each([write for write in batch if write.error is None])
+                return
+        metrics.inc("db_write_batches")
+        metrics.inc("db_write_jobs", len(batch))
+        metrics.observe("db_write_commit", time.monotonic() - started)
+
+    async def _commit_each(self, batch: list[_Write]) -> None:
+        for write in batch:
+            async with self._session_maker() as session:
+                try:
+                    write.result = await write.job(session)
+                    await session.commit()
+                except Exception as e:
+                    await session.rollback()
+                    write.error = e
+
+
+db_writer = WriteCoalescer(DB_WRITE_COALESCING, DB_WRITE_WINDOW, DB_WRITE_BATCH_SIZE)
+metrics.register_gauge("db_write_queue_depth", lambda: db_writer.depth)
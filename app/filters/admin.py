@@ -1,16 +1,12 @@
 from aiogram.filters import BaseFilter
 from aiogram.types import Message
-from app.services.validators import is_admin
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.database.db import User, UserRole  # Добавляем импорт моделей
-from sqlalchemy import select
+from app.database.db import UserRole
+from app.services.user_cache import CachedUser
 
 class AdminFilter(BaseFilter):
-    async def __call__(self, message: Message, session: AsyncSession) -> bool:
-        user = await session.scalar(select(User).where(User.telegram_id == message.from_user.id))
-        return user.role in [UserRole.ADMIN, UserRole.SUPER_ADMIN] if user else False
+    async def __call__(self, message: Message, current_user: CachedUser | None = None) -> bool:
+        return current_user.is_admin if current_user else False
 
 class SuperAdminFilter(BaseFilter):
-    async def __call__(self, message: Message, session: AsyncSession) -> bool:
-        user = await session.scalar(select(User).where(User.telegram_id == message.from_user.id))
-        return user.role == UserRole.SUPER_ADMIN if user else False
\ No newline at end of file
+    async def __call__(self, message: Message, current_user: CachedUser | None = None) -> bool:
+        return current_user.role == UserRole.SUPER_ADMIN if current_user else False
\ No newline at end of file
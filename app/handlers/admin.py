@@ -1,21 +1,24 @@
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from app.database import crud
+from app.database.writer import db_writer
 from app.services.validators import is_admin
 from app.filters.admin import AdminFilter
 from aiogram.filters import StateFilter
-from app.states import CreateTournament
-from app.services.file_handling import save_file
-from app.services.notifications import notify_super_admins
+from app.states import CreateTournament, TournamentBroadcast
+from app.services.file_handling import store_media, send_media, release_file
+from app.services.notifications import notify_super_admins, notify_team_status
+from app.services.user_cache import CachedUser
+from app.services.broadcast import count_recipients, start_broadcast
+from app.services.catalog import catalog
+from app.services.stats import read_tournament_teams
 import logging
-import os
 
-from aiogram.utils.keyboard import InlineKeyboardBuilder, InlineKeyboardButton
-from app.database.db import Tournament, Game, TournamentStatus, UserRole, User, Tournament, GameFormat, Team, User, Player, TeamStatus
+from app.database.db import Tournament, TournamentStatus, UserRole, User, Team, TeamStatus
 from app.keyboards.admin import (
     admin_main_menu,
     tournaments_management_kb,
@@ -23,12 +26,23 @@ from app.keyboards.admin import (
     back_to_admin_kb,
     team_request_kb,
     tournament_status_kb,
-    team_request_preview_kb
+    team_requests_digest_kb,
+    broadcast_confirm_kb,
+    bulk_moderation_kb,
+    pending_teams_kb,
+    parse_cursor,
+    TOURNAMENT_STATUS_FILTERS
 )
+from app.database.db import Broadcast
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Не больше заявок в одной сводке (лимит кнопок и длины сообщения)
+TEAM_REQUESTS_PER_DIGEST = 30
+# Не больше заявок на экране массовой модерации (лимит кнопок Telegram)
+BULK_MODERATION_LIMIT = 90
+
 # Главное админ-меню
 @router.message(F.text == "Админ-панель")
 async def admin_panel(message: Message):
@@ -38,65 +52,98 @@ async def admin_panel(message: Message):
 async def show_stats(call: CallbackQuery, session: AsyncSession):
     """Показ статистики"""
     stats = await crud.get_statistics(session)
-    text = (
-        "📊 Статистика:\n"
-        f"👥 Пользователей: {stats['users']}\n"
-        f"🏆 Активных турниров: {stats['active_tournaments']}\n"
-        f"👥 Зарегистрированных команд: {stats['teams']}"
-    )
-    await call.message.edit_text(text, reply_markup=back_to_admin_kb())
+    counters = stats["counters"]
+    lines = [
+        "📊 Статистика:",
+        f"👥 Пользователей: {stats['users']}",
+        f"🏆 Активных турниров: {stats['active_tournaments']}",
+        f"   всего {counters.get('tournaments', 0)}: одобрено {counters.get('tournaments:approved', 0)}, "
+        f"на модерации {counters.get('tournaments:pending', 0)}, отклонено {counters.get('tournaments:rejected', 0)}",
+        f"👥 Зарегистрированных команд: {stats['teams']}",
+        f"   одобрено {counters.get('teams:approved', 0)}, "
+        f"на модерации {counters.get('teams:pending', 0)}, отклонено {counters.get('teams:rejected', 0)}",
+    ]
+    games = await catalog.get()
+    per_game = [
+        f"🎮 {game.name}: турниров {counters.get(f'tournaments:game:{game.id}', 0)}, "
+        f"команд {counters.get(f'teams:game:{game.id}', 0)}"
+        for game in games.games
+        if counters.get(f"tournaments:game:{game.id}")
+    ]
+    if per_game:
+        lines.append("")
+        lines.extend(per_game)
+    await call.message.edit_text("\n".join(lines), reply_markup=back_to_admin_kb())
     
 @router.callback_query(F.data == "back_to_admin")
 async def back_to_admin(call: CallbackQuery):
     await call.message.edit_text("⚙️ Админ-панель:", reply_markup=admin_main_menu())
 
 
-@router.callback_query(F.data == "manage_tournaments")
-async def manage_tournaments(call: CallbackQuery, session: AsyncSession):
-    """Управление турнирами (только одобренные для обычных админов)"""
-    user = await session.scalar(
-        select(User).where(User.telegram_id == call.from_user.id)
-    )
-    
-    # Для супер-админа показываем все турниры
-    if user.role == UserRole.SUPER_ADMIN:
-        tournaments = await session.scalars(select(Tournament))
-    # Для обычного админа — только одобренные или созданные им
-    else:
-        tournaments = await session.scalars(
-            select(Tournament)
-            .where(Tournament.status == TournamentStatus.APPROVED)
-            .where(Tournament.created_by == user.id)
+async def _render_tournaments(
+    call: CallbackQuery,
+    session: AsyncSession,
+    user: CachedUser,
+    status: str = "all",
+    game_id: int = 0,
+    cursor: str = "",
+    send=None
+):
+    """Страница списка турниров с фильтрами по статусу и игре"""
+    stmt = select(Tournament.id, Tournament.name, Tournament.status)
+    # Для обычного админа — только одобренные и созданные им
+    if user.role != UserRole.SUPER_ADMIN:
+        stmt = stmt.where(Tournament.status == TournamentStatus.APPROVED, Tournament.created_by == user.id)
+    elif status != "all":
+        stmt = stmt.where(Tournament.status == TournamentStatus(status))
+    if game_id:
+        stmt = stmt.where(Tournament.game_id == game_id)
+    after, before = parse_cursor(cursor)
+    page = await crud.keyset_page(session, stmt, Tournament.id, after, before)
+    if not page.rows and cursor:
+        # Страница опустела (турниры удалены) — показываем первую
+        page = await crud.keyset_page(session, stmt, Tournament.id)
+    games = await catalog.get()
+    game = games.game(game_id)
+    await (send or call.message.edit_text)(
+        "Управление турнирами:" if page.rows else "Управление турнирами: ничего не найдено",
+        reply_markup=tournaments_management_kb(
+            page,
+            status,
+            game_id,
+            game.name if game else None,
+            games.next_game_id(game_id),
+            status_filter=user.role == UserRole.SUPER_ADMIN
         )
-    
-    await call.message.edit_text(
-        "Управление турнирами:", 
-        reply_markup=tournaments_management_kb(tournaments)
     )
 
+@router.callback_query(F.data == "manage_tournaments")
+async def manage_tournaments(call: CallbackQuery, session: AsyncSession, current_user: CachedUser | None):
+    """Управление турнирами (только одобренные для обычных админов)"""
+    await _render_tournaments(call, session, current_user)
+
+@router.callback_query(F.data.startswith("tlist_"))
+async def tournaments_page(call: CallbackQuery, session: AsyncSession, current_user: CachedUser | None):
+    _, status, game_id, cursor = call.data.split("_")
+    if status not in TOURNAMENT_STATUS_FILTERS:
+        status = "all"
+    await _render_tournaments(call, session, current_user, status, int(game_id), cursor)
+    await call.answer()
+
 
     
 # Начало создания турнира
 @router.callback_query(F.data == "create_tournament")
-async def start_creation(call: CallbackQuery, state: FSMContext, session: AsyncSession):
+async def start_creation(call: CallbackQuery, state: FSMContext):
     """Начало создания турнира - выбор игры"""
     try:
-        # Получаем список всех игр
-        games = await session.scalars(select(Game))
-        if not games:
+        # Список всех игр
+        games = await catalog.get()
+        if not games.games:
             await call.answer("❌ Нет доступных игр! Сначала добавьте игры.", show_alert=True)
             return
 
-        # Создаем клавиатуру с играми
-        builder = InlineKeyboardBuilder()
-        for game in games:
-            builder.button(
-                text=game.name, 
-                callback_data=f"admin_select_game_{game.id}"  # Исправленный префикс
-            )
-        builder.adjust(1)
-        
-        await call.message.answer("🎮 Выберите игру:", reply_markup=builder.as_markup())
+        await call.message.answer("🎮 Выберите игру:", reply_markup=games.admin_games_kb)
         await state.set_state(CreateTournament.SELECT_GAME)
         logger.info(f"User {call.from_user.id} started tournament creation")
 
@@ -108,43 +155,32 @@ async def start_creation(call: CallbackQuery, state: FSMContext, session: AsyncS
     StateFilter(CreateTournament.SELECT_GAME),
     F.data.startswith("admin_select_game_")
 )
-async def select_game(call: CallbackQuery, state: FSMContext, session: AsyncSession):
+async def select_game(call: CallbackQuery, state: FSMContext):
     game_id = int(call.data.split("_")[3])
-    game = await session.get(Game, game_id)
+    games = await catalog.get()
+    game = games.game(game_id)
     if not game:
         await call.answer("❌ Игра не найдена!", show_alert=True)
         return
 
-    # Получаем форматы для выбранной игры
-    formats = await session.scalars(
-        select(GameFormat).where(GameFormat.game_id == game_id)
-    )
-    formats = list(formats)
-    if not formats:
+    # Форматы выбранной игры
+    if not games.formats(game_id):
         await call.answer("❌ Нет форматов для этой игры!", show_alert=True)
         return
 
-    # Клавиатура с форматами
-    builder = InlineKeyboardBuilder()
-    for fmt in formats:
-        builder.button(
-            text=f"{fmt.format_name} (до {fmt.max_players_per_team})",
-            callback_data=f"admin_select_format_{fmt.id}"
-        )
-    builder.adjust(1)
     await call.message.edit_text(
         f"🎮 Игра: <b>{game.name}</b>\nВыберите формат:",
         parse_mode="HTML",
-        reply_markup=builder.as_markup()
+        reply_markup=games.admin_formats_kb[game_id]
     )
     await state.update_data(game_id=game_id)
     await state.set_state(CreateTournament.SELECT_FORMAT)
 
 # Обработка выбора формата
 @router.callback_query(F.data.startswith("admin_select_format_"))
-async def select_format(call: CallbackQuery, state: FSMContext, session: AsyncSession):
+async def select_format(call: CallbackQuery, state: FSMContext):
     format_id = int(call.data.split("_")[3])
-    fmt = await session.get(GameFormat, format_id)
+    fmt = (await catalog.get()).format(format_id)
     if not fmt:
         await call.answer("❌ Формат не найден!", show_alert=True)
         return
@@ -165,10 +201,11 @@ async def process_name(message: Message, state: FSMContext):
 
 # Обработка логотипа
 @router.message(CreateTournament.LOGO, F.photo)
-async def process_logo(message: Message, state: FSMContext, bot: Bot):
-    file_id = message.photo[-1].file_id
-    file_path = await save_file(bot, file_id, "tournaments/logos")
-    await state.update_data(logo_path=file_path)
+async def process_logo(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
+    photo = message.photo[-1]
+    file_id = photo.file_id
+    file_path = await store_media(bot, file_id, "tournaments/logos", session, photo.file_unique_id)
+    await state.update_data(logo_path=file_path, logo_file_id=file_id)
     await message.answer("📅 Введите дату начала (ДД.ММ.ГГГГ ЧЧ:ММ):")
     await state.set_state(CreateTournament.START_DATE)
 
@@ -192,19 +229,24 @@ async def process_description(message: Message, state: FSMContext):
 
 # Обработка регламента
 @router.message(CreateTournament.REGULATIONS, F.document)
-async def finish_creation(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
+async def finish_creation(message: Message, state: FSMContext, bot: Bot, session: AsyncSession, current_user: CachedUser | None):
     if message.document.mime_type != "application/pdf":
         return await message.answer("❌ Только PDF-файлы!")
     
-    user = await session.scalar(
-        select(User).where(User.telegram_id == message.from_user.id))
+    user = current_user
     
     if not user:
         await message.answer("❌ Пользователь не найден! Вызовите /start")
         await state.clear()
         return
     
-    file_path = await save_file(bot, message.document.file_id, "tournaments/regulations")
+    file_path = await store_media(
+        bot,
+        message.document.file_id,
+        "tournaments/regulations",
+        session,
+        message.document.file_unique_id
+    )
     data = await state.get_data()
 
     status = (
@@ -218,24 +260,26 @@ async def finish_creation(message: Message, state: FSMContext, bot: Bot, session
         format_id=data['format_id'],  # <--- добавьте это!
         name=data['name'],
         logo_path=data['logo_path'],
+        logo_file_id=data.get('logo_file_id'),
         start_date=data['start_date'],
         description=data['description'],
         regulations_path=file_path,
+        regulations_file_id=message.document.file_id,
         is_active=True,
         status=status,
         created_by=user.id
     )
     
     session.add(tournament)
-    await session.commit()
-    
     if status == TournamentStatus.PENDING:
-        # Передаем session в функцию
+        # Уведомление пишется в той же транзакции, что и турнир
         await notify_super_admins(
-            bot=bot,
             text=f"Новый турнир на модерации: {data['name']}",
             session=session 
         )
+    else:
+        crud.mark_tournaments_changed(session, tournament.format_id)
+    await session.commit()
     
     await message.answer(
         f"✅ Турнир <b>{data['name']}</b> успешно создан, и был отправлен на модерацию!\n"
@@ -246,13 +290,11 @@ async def finish_creation(message: Message, state: FSMContext, bot: Bot, session
 
     
 @router.callback_query(F.data.startswith("edit_tournament_"))
-async def show_tournament_details(call: CallbackQuery, session: AsyncSession):
+async def show_tournament_details(call: CallbackQuery, session: AsyncSession, current_user: CachedUser | None):
     """Просмотр турнира (только если он одобрен или пользователь — супер-админ)"""
     tournament_id = int(call.data.split("_")[2])
     tournament = await session.get(Tournament, tournament_id)
-    user = await session.scalar(
-        select(User).where(User.telegram_id == call.from_user.id)
-    )
+    user = current_user
 
     if not tournament:
         await call.answer("❌ Турнир не найден!", show_alert=True)
@@ -267,37 +309,43 @@ async def show_tournament_details(call: CallbackQuery, session: AsyncSession):
         return
 
     # Получаем связанную игру
-    game = await session.get(Game, tournament.game_id)
+    game = (await catalog.get()).game(tournament.game_id)
 
     # 1. Отправляем логотип, если есть
-    if tournament.logo_path and os.path.exists(tournament.logo_path):
+    if tournament.logo_file_id or tournament.logo_path:
         try:
-            logo = FSInputFile(tournament.logo_path)
-            await call.message.answer_photo(
-                photo=logo,
+            tournament.logo_file_id = await send_media(
+                call.message.answer_photo,
+                tournament.logo_file_id,
+                tournament.logo_path,
                 caption=f"🏆 {tournament.name}"
             )
         except Exception:
             await call.message.answer("⚠️ Логотип не найден!")
 
     # 2. Отправляем регламент, если есть
-    if tournament.regulations_path and os.path.exists(tournament.regulations_path):
+    if tournament.regulations_file_id or tournament.regulations_path:
         try:
-            regulations = FSInputFile(tournament.regulations_path)
-            await call.message.answer_document(
-                document=regulations,
+            tournament.regulations_file_id = await send_media(
+                call.message.answer_document,
+                tournament.regulations_file_id,
+                tournament.regulations_path,
                 caption="📄 Регламент турнира"
             )
         except Exception:
             await call.message.answer("⚠️ Регламент не найден!")
+    # Сохраняем file_id, если Telegram выдал новый (no-op, если ничего не изменилось)
+    await session.commit()
 
     # 3. Описание и кнопки — последним сообщением (кнопки будут внизу)
+    teams = await read_tournament_teams(session, tournament_id)
     text = (
         f"🏆 <b>{tournament.name}</b>\n\n"
         f"🎮 Игра: {game.name if game else 'Не указана'}\n"
         f"🕒 Дата старта: {tournament.start_date.strftime('%d.%m.%Y %H:%M')}\n"
         f"📝 Описание: {tournament.description}\n"
-        f"🔄 Статус: {'Активен ✅' if tournament.is_active else 'Неактивен ❌'}"
+        f"🔄 Статус: {'Активен ✅' if tournament.is_active else 'Неактивен ❌'}\n"
+        f"👥 Команд: {teams.get('', 0)} (одобрено {teams.get('approved', 0)}, на модерации {teams.get('pending', 0)})"
     )
     await call.message.answer(
         text,
@@ -315,33 +363,23 @@ async def delete_tournament(call: CallbackQuery, session: AsyncSession):
         await call.answer("❌ Турнир не найден!", show_alert=True)
         return
 
-    # Удаляем файлы
-    import os
-    if os.path.exists(tournament.logo_path):
-        os.remove(tournament.logo_path)
-    if os.path.exists(tournament.regulations_path):
-        os.remove(tournament.regulations_path)
+    # Удаляем файлы (общие файлы остаются, пока на них есть ссылки)
+    await release_file(session, tournament.logo_path)
+    await release_file(session, tournament.regulations_path)
     
-    # Удаляем из БД
-    await session.delete(tournament)
-    await session.commit()
+    # Удаляем из БД (там же коммит)
+    await crud.delete_tournament(session, tournament_id)
     
     await call.message.edit_text("✅ Турнир и все файлы удалены")
     
 @router.callback_query(F.data == "back_to_tournaments")
-async def back_to_tournaments_list(call: CallbackQuery, session: AsyncSession):
+async def back_to_tournaments_list(call: CallbackQuery, session: AsyncSession, current_user: CachedUser | None):
     try:
         # Удаляем сообщение с действиями
         await call.message.delete()
         
-        # Получаем обновленный список турниров
-        tournaments = await session.scalars(select(Tournament))
-        
-        # Отправляем новый список
-        await call.message.answer(
-            "Управление турнирами:",
-            reply_markup=tournaments_management_kb(tournaments)
-        )
+        # Отправляем новый список (с теми же правами, что и в manage_tournaments)
+        await _render_tournaments(call, session, current_user, send=call.message.answer)
     except Exception as e:
         logging.error(f"Back error: {e}")
         await call.answer("⚠️ Ошибка возврата!")
@@ -349,130 +387,135 @@ async def back_to_tournaments_list(call: CallbackQuery, session: AsyncSession):
 
 
 @router.callback_query(F.data == "team_requests")
-async def show_team_requests(call: CallbackQuery, session: AsyncSession):
+async def show_team_requests(call: CallbackQuery, session: AsyncSession, current_user: CachedUser | None):
     """Показать заявки команд на участие в турнире"""
-    user = await session.scalar(
-        select(User).where(User.telegram_id == call.from_user.id)
-    )
+    user = current_user
     
     if user.role != UserRole.SUPER_ADMIN:
         await call.answer("🚫 Доступ запрещен!", show_alert=True)
         return
     
-    # Получаем все турниры
-    tournaments = await session.scalars(select(Tournament))
-    
-    # Формируем список заявок
-    requests = []
-    for tournament in tournaments:
-        teams = await tournament.teams  # Загрузка связанных команд
-        for team in teams:
-            if getattr(team, "status", None) == TeamStatus.PENDING:
-                requests.append((tournament, team))
-    
-    if not requests:
+    # Все заявки одним запросом, сгруппированные по создателю турнира
+    rows = await session.execute(
+        select(User.telegram_id, Tournament.name, Team.id, Team.team_name)
+        .join(Tournament, Tournament.id == Team.tournament_id)
+        .join(User, User.id == Tournament.created_by)
+        .where(Team.status == TeamStatus.PENDING)
+        .order_by(User.telegram_id, Tournament.id, Team.id)
+    )
+    digests: dict[int, list[tuple[str, int, str]]] = {}
+    for creator_tg_id, tournament_name, team_id, team_name in rows:
+        digests.setdefault(creator_tg_id, []).append((tournament_name, team_id, team_name))
+
+    if not digests:
         await call.answer("📭 Нет новых заявок на участие в турнирах.")
         return
 
-    # Формируем сообщение с заявками
-    for tournament, team in requests:
-        creator = await session.get(User, tournament.created_by)
-        await call.message.bot.send_message(
-            creator.telegram_id,
-            f"📝 Новая команда хочет зарегистрироваться на ваш турнир: {tournament.name}\n"
-            f"Команда: {team.team_name}\n",
-            reply_markup=team_request_preview_kb(team.id)
-        )
+    # Одна сводка на создателя (длинные — частями)
+    for creator_tg_id, requests in digests.items():
+        for start in range(0, len(requests), TEAM_REQUESTS_PER_DIGEST):
+            chunk = requests[start:start + TEAM_REQUESTS_PER_DIGEST]
+            lines = [f"• {team_name} — {tournament_name}" for tournament_name, _, team_name in chunk]
+            await call.message.bot.send_message(
+                creator_tg_id,
+                "📝 Новые заявки команд на ваши турниры:\n" + "\n".join(lines),
+                reply_markup=team_requests_digest_kb([(team_id, team_name) for _, team_id, team_name in chunk])
+            )
     
     await call.answer("📬 Уведомления отправлены создателям турниров.")
 
-@router.callback_query(F.data == "moderate_teams")
-async def show_pending_teams(call: CallbackQuery, session: AsyncSession):
-    """Список команд на модерации"""
+async def _render_pending_teams(
+    call: CallbackQuery,
+    session: AsyncSession,
+    user: CachedUser,
+    game_id: int = 0,
+    cursor: str = ""
+):
+    """Страница заявок на модерации с фильтром по игре"""
+    stmt = select(Team.id, Team.team_name, Team.tournament_id).where(Team.status == TeamStatus.PENDING)
     # Для супер-админа — все команды, для админа — только свои турниры
-    user = await session.scalar(select(User).where(User.telegram_id == call.from_user.id))
-    if user.role == UserRole.SUPER_ADMIN:
-        teams = await session.scalars(
-            select(Team).where(Team.status == TeamStatus.PENDING)
-        )
-    else:
-        # Только команды в турнирах, созданных этим админом
-        tournaments = await session.scalars(
-            select(Tournament.id).where(Tournament.created_by == user.id)
-        )
-        teams = await session.scalars(
-            select(Team).where(
-                Team.status == TeamStatus.PENDING,
-                Team.tournament_id.in_(tournaments)
-            )
-        )
-    teams = list(teams)
-    if not teams:
+    if user.role != UserRole.SUPER_ADMIN or game_id:
+        stmt = stmt.join(Tournament, Tournament.id == Team.tournament_id)
+    if user.role != UserRole.SUPER_ADMIN:
+        stmt = stmt.where(Tournament.created_by == user.id)
+    if game_id:
+        stmt = stmt.where(Tournament.game_id == game_id)
+    after, before = parse_cursor(cursor)
+    page = await crud.keyset_page(session, stmt, Team.id, after, before)
+    if not page.rows and cursor:
+        page = await crud.keyset_page(session, stmt, Team.id)
+    if not page.rows and not game_id:
         await call.message.edit_text("📭 Нет новых заявок на участие в турнирах.", reply_markup=back_to_admin_kb())
         return
 
-    builder = InlineKeyboardBuilder()
-    for team in teams:
-        builder.button(
-            text=f"{team.team_name} (турнир ID: {team.tournament_id})",
-            callback_data=f"moderate_team_{team.id}"
-        )
-    builder.row(InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_admin"))
+    games = await catalog.get()
+    game = games.game(game_id)
     await call.message.edit_text(
-        "📝 Заявки команд на модерации:",
-        reply_markup=builder.as_markup()
+        "📝 Заявки команд на модерации:" if page.rows else "📭 Нет заявок по этой игре.",
+        reply_markup=pending_teams_kb(page, game_id, game.name if game else None, games.next_game_id(game_id))
     )
 
+@router.callback_query(F.data == "moderate_teams")
+async def show_pending_teams(call: CallbackQuery, session: AsyncSession, current_user: CachedUser | None):
+    """Список команд на модерации"""
+    await _render_pending_teams(call, session, current_user)
+
+@router.callback_query(F.data.startswith("pteams_"))
+async def pending_teams_page(call: CallbackQuery, session: AsyncSession, current_user: CachedUser | None):
+    _, game_id, cursor = call.data.split("_")
+    await _render_pending_teams(call, session, current_user, int(game_id), cursor)
+    await call.answer()
+
 @router.callback_query(F.data.startswith("moderate_team_"))
 async def moderate_team(call: CallbackQuery, session: AsyncSession):
     team_id = int(call.data.split("_")[2])
-    team = await session.get(Team, team_id)
-    if not team:
+    card = await crud.get_team_card(session, team_id)
+    if not card:
         await call.answer("Команда не найдена", show_alert=True)
         return
-    tournament = await session.get(Tournament, team.tournament_id)
-    players = await session.scalars(select(Player).where(Player.team_id == team.id))
-    players = list(players)
-    player_usernames = []
-    for player in players:
-        user = await session.scalar(select(User).where(User.telegram_id == player.user_id))
-        if user:
-            player_usernames.append(f"@{user.username or user.telegram_id}")
+    team, tournament = card.team, card.tournament
     text = (
         f"Команда: <b>{team.team_name}</b>\n"
         f"Турнир: {tournament.name if tournament else team.tournament_id}\n"
         f"Капитан: <a href='tg://user?id={team.captain_tg_id}'>{team.captain_tg_id}</a>\n"
-        f"Участники: {', '.join(player_usernames)}"
+        f"Участники: {', '.join(card.player_names)}"
     )
     await call.message.edit_text(
         text,
         parse_mode="HTML",
-        reply_markup=team_request_kb(team.id)
+        reply_markup=team_request_kb(team.id, team.tournament_id)
     )
     
 @router.callback_query(F.data.regexp(r"^(de)?activate_tournament_\d+$"))
-async def toggle_tournament_status(call: CallbackQuery, session: AsyncSession):
+async def toggle_tournament_status(call: CallbackQuery, session: AsyncSession, current_user: CachedUser | None):
     data = call.data
     tournament_id = int(data.split("_")[-1])
-    tournament = await session.get(Tournament, tournament_id)
-    user = await session.scalar(
-        select(User).where(User.telegram_id == call.from_user.id)
-    )
-    # Только супер-админ или создатель турнира
-    if not tournament or not (
-        user.role == UserRole.SUPER_ADMIN or tournament.created_by == user.id
-    ):
-        await call.answer("Нет прав для изменения статуса!", show_alert=True)
-        return
+    user = current_user
+    is_active = not data.startswith("deactivate")
+    # Только супер-админ или создатель турнира — проверяется прямо в UPDATE
+    conditions = [] if user.role == UserRole.SUPER_ADMIN else [Tournament.created_by == user.id]
+
+    async def set_active(write_session: AsyncSession) -> Tournament | None:
+        tournament = await crud.compare_and_set(
+            write_session, Tournament, tournament_id, "is_active", not is_active, is_active, *conditions
+        )
+        if tournament:
+            crud.mark_tournaments_changed(write_session, tournament.format_id)
+        return tournament
 
-    if data.startswith("deactivate"):
-        tournament.is_active = False
-        await session.commit()
-        await call.answer("Турнир деактивирован!", show_alert=True)
+    tournament = await db_writer.run(session, set_active)
+    if tournament:
+        await call.answer("Турнир активирован!" if is_active else "Турнир деактивирован!", show_alert=True)
     else:
-        tournament.is_active = True
-        await session.commit()
-        await call.answer("Турнир активирован!", show_alert=True)
+        await session.rollback()
+        tournament = await session.get(Tournament, tournament_id)
+        if not tournament or not (
+            user.role == UserRole.SUPER_ADMIN or tournament.created_by == user.id
+        ):
+            await call.answer("Нет прав для изменения статуса!", show_alert=True)
+            return
+        # Уже в нужном состоянии (например, второй админ успел раньше)
+        await call.answer("Статус турнира уже изменён", show_alert=True)
 
     # Обновить клавиатуру
     await call.message.edit_reply_markup(
@@ -482,33 +525,174 @@ async def toggle_tournament_status(call: CallbackQuery, session: AsyncSession):
 @router.callback_query(F.data.startswith("preview_team_"))
 async def preview_team(call: CallbackQuery, session: AsyncSession):
     team_id = int(call.data.split("_")[2])
-    team = await session.get(Team, team_id)
-    if not team:
+    card = await crud.get_team_card(session, team_id)
+    if not card:
         await call.answer("Команда не найдена", show_alert=True)
         return
-    tournament = await session.get(Tournament, team.tournament_id)
-    players = await session.scalars(select(Player).where(Player.team_id == team.id))
-    players = list(players)
-    player_usernames = []
-    captain = await session.scalar(select(User).where(User.telegram_id == team.captain_tg_id))
-    if captain and captain.username:
-        captain_info = f"@{captain.username}"
-    elif captain and captain.full_name:
-        captain_info = captain.full_name
-    else:
-        captain_info = str(team.captain_tg_id)
-    for player in players:
-        user = await session.scalar(select(User).where(User.telegram_id == player.user_id))
-        if user:
-            player_usernames.append(f"@{user.username or user.telegram_id}")
+    team, tournament = card.team, card.tournament
     text = (
         f"Команда: <b>{team.team_name}</b>\n"
         f"Турнир: {tournament.name if tournament else team.tournament_id}\n"
-        f"Капитан: {captain_info}\n"
-        f"Участники: {', '.join(player_usernames)}"
+        f"Капитан: {card.captain_info}\n"
+        f"Участники: {', '.join(card.player_names)}"
     )
     await call.message.edit_text(
         text,
         parse_mode="HTML",
         reply_markup=team_request_kb(team.id)
-    )
\ No newline at end of file
+    )
+    
+@router.callback_query(F.data.startswith("broadcast_tournament_"))
+async def start_tournament_broadcast(call: CallbackQuery, state: FSMContext, session: AsyncSession, current_user: CachedUser | None):
+    """Рассылка капитанам и игрокам одобренных команд турнира"""
+    tournament_id = int(call.data.split("_")[2])
+    tournament = await session.get(Tournament, tournament_id)
+    user = current_user
+    if not tournament or not user or not (
+        user.role == UserRole.SUPER_ADMIN or tournament.created_by == user.id
+    ):
+        await call.answer("🚫 Нет прав для рассылки!", show_alert=True)
+        return
+    await state.update_data(broadcast_tournament_id=tournament_id)
+    await call.message.answer(
+        f"📢 Рассылка участникам турнира <b>{tournament.name}</b>\n"
+        "Введите текст сообщения (/cancel — отмена):",
+        parse_mode="HTML"
+    )
+    await state.set_state(TournamentBroadcast.TEXT)
+
+@router.message(TournamentBroadcast.TEXT, F.text)
+async def process_broadcast_text(message: Message, state: FSMContext, session: AsyncSession):
+    data = await state.get_data()
+    recipients = await count_recipients(session, data["broadcast_tournament_id"])
+    if not recipients:
+        await message.answer("📭 В турнире нет одобренных команд — некому отправлять.")
+        await state.clear()
+        return
+    await state.update_data(broadcast_text=message.html_text)
+    await message.answer(
+        f"Получателей: {recipients}\nОтправить сообщение?",
+        reply_markup=broadcast_confirm_kb()
+    )
+    await state.set_state(TournamentBroadcast.CONFIRM)
+
+@router.callback_query(TournamentBroadcast.CONFIRM, F.data == "broadcast_confirm")
+async def confirm_broadcast(call: CallbackQuery, state: FSMContext, session: AsyncSession, bot: Bot):
+    data = await state.get_data()
+    await state.clear()
+    progress = await call.message.edit_text("📢 Рассылка запущена...")
+    broadcast = Broadcast(
+        tournament_id=data["broadcast_tournament_id"],
+        admin_chat_id=call.message.chat.id,
+        progress_message_id=progress.message_id if isinstance(progress, Message) else None,
+        text=data["broadcast_text"]
+    )
+    session.add(broadcast)
+    await session.commit()
+    start_broadcast(bot, broadcast.id)
+    logger.info(f"User {call.from_user.id} started broadcast {broadcast.id}")
+
+@router.callback_query(F.data == "broadcast_cancel")
+async def cancel_broadcast(call: CallbackQuery, state: FSMContext):
+    await state.clear()
+    await call.message.edit_text("❌ Рассылка отменена")
+
+
+async def _render_bulk_moderation(call: CallbackQuery, state: FSMContext, session: AsyncSession, user: CachedUser):
+    stmt = (
+        select(Team.id, Team.team_name, Team.tournament_id)
+        .where(Team.status == TeamStatus.PENDING)
+        .order_by(Team.id)
+        .limit(BULK_MODERATION_LIMIT)
+    )
+    if user.role != UserRole.SUPER_ADMIN:
+        stmt = stmt.where(Team.tournament_id.in_(
+            select(Tournament.id).where(Tournament.created_by == user.id)
+        ))
+    teams = (await session.execute(stmt)).all()
+    if not teams:
+        await state.update_data(bulk_selected=[])
+        await call.message.edit_text("📭 Нет новых заявок на участие в турнирах.", reply_markup=back_to_admin_kb())
+        return
+    data = await state.get_data()
+    visible = {team_id for team_id, _, _ in teams}
+    selected = set(data.get("bulk_selected", [])) & visible
+    await state.update_data(bulk_selected=list(selected))
+    await call.message.edit_text(
+        "☑️ Отметьте заявки и выберите действие:",
+        reply_markup=bulk_moderation_kb(teams, selected)
+    )
+
+@router.callback_query(F.data == "bulk_moderation")
+async def bulk_moderation(call: CallbackQuery, state: FSMContext, session: AsyncSession, current_user: CachedUser | None):
+    """Массовая модерация заявок"""
+    if not current_user or not current_user.is_admin:
+        await call.answer("🚫 Доступ запрещен!", show_alert=True)
+        return
+    await state.update_data(bulk_selected=[])
+    await _render_bulk_moderation(call, state, session, current_user)
+
+@router.callback_query(F.data.startswith("bulk_toggle_"))
+async def bulk_toggle(call: CallbackQuery, state: FSMContext, session: AsyncSession, current_user: CachedUser | None):
+    if not current_user or not current_user.is_admin:
+        await call.answer("🚫 Доступ запрещен!", show_alert=True)
+        return
+    team_id = int(call.data.split("_")[2])
+    data = await state.get_data()
+    selected = set(data.get("bulk_selected", []))
+    selected ^= {team_id}
+    await state.update_data(bulk_selected=list(selected))
+    await _render_bulk_moderation(call, state, session, current_user)
+
+async def _apply_bulk_status(
+    call: CallbackQuery,
+    session: AsyncSession,
+    user: CachedUser,
+    new_status: TeamStatus,
+    team_ids: list[int] | None = None,
+    tournament_id: int | None = None
+) -> int:
+    """Один UPDATE + уведомления капитанам в той же транзакции"""
+    async def set_statuses(write_session: AsyncSession) -> list[tuple[int, int, str]]:
+        teams = await crud.bulk_set_team_status(
+            write_session,
+            new_status,
+            team_ids=team_ids,
+            tournament_id=tournament_id,
+            created_by=None if user.role == UserRole.SUPER_ADMIN else user.id
+        )
+        for _, captain_tg_id, team_name in teams:
+            notify_team_status(write_session, captain_tg_id, team_name, new_status)
+        return teams
+
+    teams = await db_writer.run(session, set_statuses)
+    logger.info(f"User {call.from_user.id} set {new_status.value} for {len(teams)} teams")
+    return len(teams)
+
+@router.callback_query(F.data.in_({"bulk_approve", "bulk_reject"}))
+async def bulk_apply_selected(call: CallbackQuery, state: FSMContext, session: AsyncSession, current_user: CachedUser | None):
+    if not current_user or not current_user.is_admin:
+        await call.answer("🚫 Доступ запрещен!", show_alert=True)
+        return
+    data = await state.get_data()
+    selected = data.get("bulk_selected", [])
+    if not selected:
+        await call.answer("Отметьте хотя бы одну заявку", show_alert=True)
+        return
+    new_status = TeamStatus.APPROVED if call.data == "bulk_approve" else TeamStatus.REJECTED
+    count = await _apply_bulk_status(call, session, current_user, new_status, team_ids=selected)
+    await state.update_data(bulk_selected=[])
+    await call.answer(f"Обработано заявок: {count}", show_alert=True)
+    await _render_bulk_moderation(call, state, session, current_user)
+
+@router.callback_query(F.data.regexp(r"^bulk_(approve|reject)_tournament_\d+$"))
+async def bulk_apply_tournament(call: CallbackQuery, session: AsyncSession, current_user: CachedUser | None):
+    """Все заявки турнира разом"""
+    if not current_user or not current_user.is_admin:
+        await call.answer("🚫 Доступ запрещен!", show_alert=True)
+        return
+    tournament_id = int(call.data.split("_")[-1])
+    new_status = TeamStatus.APPROVED if call.data.startswith("bulk_approve") else TeamStatus.REJECTED
+    count = await _apply_bulk_status(call, session, current_user, new_status, tournament_id=tournament_id)
+    await call.answer(f"Обработано заявок: {count}", show_alert=True)
+    await call.message.delete()
@@ -0,0 +1,20 @@
+from aiogram import Router
+from aiogram.types import ChatMemberUpdated
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.middleware import REQUIRED_CHANNELS
+from app.services.membership import membership_index, match_channel, is_member_status
+
+router = Router()
+
+@router.chat_member()
+async def on_channel_member(event: ChatMemberUpdated, session: AsyncSession):
+    """Обновление индекса подписок при входе/выходе из обязательного канала"""
+    channel = match_channel(event.chat, REQUIRED_CHANNELS)
+    if channel is None:
+        return
+    await membership_index.update(
+        session,
+        channel,
+        event.new_chat_member.user.id,
+        is_member_status(event.new_chat_member)
+    )
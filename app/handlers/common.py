@@ -8,10 +8,11 @@ from app.keyboards.user import main_menu_kb
 from app.keyboards.admin import admin_main_menu
 from app.database.db import User, UserRole
 from app.database.db import async_session_maker
-from sqlalchemy import select
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
 from app.keyboards.admin import super_admin_menu
+from app.services.user_cache import CachedUser, user_cache
+from app.database.writer import db_writer
 import os
 import logging
 
@@ -22,31 +23,31 @@ SUPER_ADMINS = list(map(int, os.getenv("SUPER_ADMINS", "").split(",")))
 router = Router()
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, session: AsyncSession):
+async def cmd_start(message: Message, session: AsyncSession, current_user: CachedUser | None):
     logger.info(f"User {message.from_user.id} triggered /start")
     try:
-        # Используем telegram_id вместо id!
-        user = await session.scalar(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
+        user = current_user
         logger.debug(f"[DEBUG /start] User from DB: {user}")
         
         if not user:
             # Создаем пользователя
-            new_user = User(
-                telegram_id=message.from_user.id,
-                full_name=message.from_user.full_name,
-                username=message.from_user.username,
-                role=UserRole.SUPER_ADMIN if message.from_user.id in SUPER_ADMINS else UserRole.USER
-            )
-            session.add(new_user)
-            await session.commit()
+            async def add_user(write_session: AsyncSession):
+                write_session.add(User(
+                    telegram_id=message.from_user.id,
+                    full_name=message.from_user.full_name,
+                    username=message.from_user.username,
+                    role=UserRole.SUPER_ADMIN if message.from_user.id in SUPER_ADMINS else UserRole.USER
+                ))
+
+            await db_writer.run(session, add_user)
+            user_cache.invalidate(message.from_user.id)
             await message.answer("🎉 Добро пожаловать!")
         else:
             await message.answer("👋 С возвращением!")
             
     except IntegrityError as e:
         await session.rollback()
+        user_cache.invalidate(message.from_user.id)
         await message.answer("👋 С возвращением!")
         
     await message.answer("Главное меню:", reply_markup=main_menu_kb())
@@ -58,10 +59,8 @@ async def cancel_action(message: Message, state: FSMContext):
     await message.answer("❌ Действие отменено")
     
 @router.message(Command("admin"))
-async def cmd_admin(message: Message, session: AsyncSession):
-    user = await session.scalar(
-        select(User).where(User.telegram_id == message.from_user.id)
-    )
+async def cmd_admin(message: Message, current_user: CachedUser | None):
+    user = current_user
     
     if not user:
         await message.answer("❌ Сначала вызовите /start")
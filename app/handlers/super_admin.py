@@ -1,15 +1,22 @@
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, FSInputFile, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.database.db import User, UserRole, Tournament, TournamentStatus, Game
+from sqlalchemy import select, func
+from app.database.db import User, UserRole, Tournament, TournamentStatus
 from app.database.crud import update_user_role
-from app.keyboards.admin import super_admin_menu, manage_admins_kb, admin_main_menu, moderation_actions_kb
+from app.keyboards.admin import super_admin_menu, manage_admins_kb, pending_tournaments_kb, admin_main_menu, moderation_actions_kb, parse_cursor
 from app.filters.admin import SuperAdminFilter
 from app.states import AdminActions
 from aiogram.fsm.context import FSMContext
+from app.services import metrics
+from app.services.user_cache import user_cache
+from app.database.crud import add_notification, transition_status, mark_tournaments_changed, keyset_page
+from app.database.writer import db_writer
+from app.services.file_handling import send_media
+from app.services.catalog import catalog
+from app.services.stats import recompute_counters
+from functools import partial
 
 router = Router()
 router.message.filter(SuperAdminFilter())
@@ -19,12 +26,51 @@ async def super_admin_panel(message: Message, session: AsyncSession):
     """Панель супер-администратора"""
     await message.answer("⚡️ Супер-админ панель:", reply_markup=super_admin_menu())
 
+@router.message(Command("metrics"))
+async def show_metrics(message: Message):
+    """Внутренние метрики бота"""
+    stats = metrics.snapshot()
+    if not stats:
+        await message.answer("📈 Метрик пока нет")
+        return
+    lines = [f"{name}: {value}" for name, value in sorted(stats.items())]
+    await message.answer("📈 Метрики:\n" + "\n".join(lines))
+
+@router.message(Command("recompute_stats"))
+async def recompute_stats(message: Message, session: AsyncSession):
+    """Пересчитать счётчики статистики по таблицам (если они разошлись с данными)"""
+    conn = await session.connection()
+    count = await conn.run_sync(recompute_counters)
+    await session.commit()
+    await message.answer(f"🔄 Статистика пересчитана, счётчиков: {count}")
+
+@router.message(Command("reload_catalog"))
+async def reload_catalog(message: Message):
+    """Перечитать игры и форматы (после правок БД вручную)"""
+    catalog.invalidate()
+    games = await catalog.get()
+    await message.answer(f"🔄 Справочник обновлён: игр {len(games.games)}, форматов {len(games.formats_by_id)}")
+
+async def _render_admins(call: CallbackQuery, session: AsyncSession, cursor: str = ""):
+    """Страница списка администраторов"""
+    stmt = select(User.id, User.full_name, User.role).where(
+        User.role.in_([UserRole.ADMIN, UserRole.SUPER_ADMIN])
+    )
+    after, before = parse_cursor(cursor)
+    page = await keyset_page(session, stmt, User.id, after, before)
+    if not page.rows and cursor:
+        page = await keyset_page(session, stmt, User.id)
+    await call.message.edit_text("👥 Нажмите на Ник админа чтоб удалить его:", reply_markup=manage_admins_kb(page))
+
 @router.callback_query(F.data == "manage_admins")
 async def manage_admins(call: CallbackQuery, session: AsyncSession):
     """Управление администраторами"""
-    admins = await session.scalars(
-        select(User).where(User.role.in_([UserRole.ADMIN, UserRole.SUPER_ADMIN])))
-    await call.message.edit_text("👥 Нажмите на Ник админа чтоб удалить его:", reply_markup=manage_admins_kb(admins))
+    await _render_admins(call, session)
+
+@router.callback_query(F.data.startswith("admins_"))
+async def admins_page(call: CallbackQuery, session: AsyncSession):
+    await _render_admins(call, session, call.data.split("_")[1])
+    await call.answer()
 
 @router.callback_query(F.data.startswith("toggle_admin_"))
 async def toggle_admin(call: CallbackQuery, session: AsyncSession):
@@ -39,6 +85,7 @@ async def toggle_admin(call: CallbackQuery, session: AsyncSession):
     new_role = UserRole.USER if target_user.role == UserRole.ADMIN else UserRole.ADMIN
     target_user.role = new_role
     await session.commit()
+    user_cache.invalidate(target_user.telegram_id)
     
     await call.answer(f"✅ Статус {target_user.full_name} изменен!")
     await manage_admins(call, session)  # Обновляем список
@@ -51,14 +98,6 @@ async def switch_to_admin_menu(call: CallbackQuery):
         reply_markup=admin_main_menu()  # Используем клавиатуру из admin.py
     )
     
-@router.callback_query(F.data == "manage_admins")
-async def manage_admins(call: CallbackQuery, session: AsyncSession):
-    """Показать список админов"""
-    admins = await session.scalars(
-        select(User).where(User.role.in_([UserRole.ADMIN, UserRole.SUPER_ADMIN]))
-    )
-    await call.message.edit_text("👥 Список администраторов:", reply_markup=manage_admins_kb(admins))
-
 # Начало добавления админа
 @router.callback_query(F.data == "add_admin")
 async def start_add_admin(call: CallbackQuery, state: FSMContext):
@@ -75,7 +114,7 @@ async def process_admin_username(message: Message, session: AsyncSession, state:
         return
     
     target_user = await session.scalar(
-        select(User).where(User.username == username))
+        select(User).where(func.lower(User.username) == username.lower()))
     
     if not target_user:
         await message.answer("❌ Пользователь не найден!")
@@ -101,43 +140,31 @@ async def switch_to_admin_menu(call: CallbackQuery):
         reply_markup=super_admin_menu()  # Используем клавиатуру из admin.py
     )
     
+async def _render_pending_tournaments(call: CallbackQuery, session: AsyncSession, cursor: str = ""):
+    """Страница турниров на модерации"""
+    stmt = select(Tournament.id, Tournament.name).where(Tournament.status == TournamentStatus.PENDING)
+    after, before = parse_cursor(cursor)
+    page = await keyset_page(session, stmt, Tournament.id, after, before)
+    if not page.rows and cursor:
+        page = await keyset_page(session, stmt, Tournament.id)
+    await call.message.edit_text("📋 Турниры на модерации:", reply_markup=pending_tournaments_kb(page))
+
 @router.callback_query(F.data == "moderate_tournaments")
 async def show_pending_tournaments(call: CallbackQuery, session: AsyncSession):
     """Список турниров на модерации"""
-    tournaments = await session.scalars(
-        select(Tournament)
-        .where(Tournament.status == TournamentStatus.PENDING)
-    )
-    
-    builder = InlineKeyboardBuilder()
-    
-    # Кнопки турниров (по одной в ряд)
-    for tournament in tournaments:
-        builder.button(
-            text=f"{tournament.name}",
-            callback_data=f"view_pending_tournament_{tournament.id}"
-        )
-    builder.adjust(1)  # По одному в ряд
-    
-    # Кнопка "Назад" отдельным рядом
-    builder.row(
-        InlineKeyboardButton(
-            text="◀️ Назад", 
-            callback_data="back_to_super_admin"
-        )
-    )
-    
-    await call.message.edit_text(
-        "📋 Турниры на модерации:",
-        reply_markup=builder.as_markup()
-    )
+    await _render_pending_tournaments(call, session)
+
+@router.callback_query(F.data.startswith("ptournaments_"))
+async def pending_tournaments_page(call: CallbackQuery, session: AsyncSession):
+    await _render_pending_tournaments(call, session, call.data.split("_")[1])
+    await call.answer()
 
 @router.callback_query(F.data.startswith("view_pending_tournament_"))
 async def view_pending_tournament(call: CallbackQuery, session: AsyncSession, bot: Bot):
     """Детали турнира для модерации"""
     tournament_id = int(call.data.split("_")[3])
     tournament = await session.get(Tournament, tournament_id)
-    game = await session.get(Game, tournament.game_id)
+    game = (await catalog.get()).game(tournament.game_id)
     
     # Формируем сообщение
     text = (
@@ -149,17 +176,21 @@ async def view_pending_tournament(call: CallbackQuery, session: AsyncSession, bo
     
     # Отправляем логотип
     try:
-        logo = FSInputFile(tournament.logo_path)
-        await bot.send_photo(call.from_user.id, photo=logo, caption=text)
+        tournament.logo_file_id = await send_media(
+            partial(bot.send_photo, call.from_user.id),
+            tournament.logo_file_id,
+            tournament.logo_path,
+            caption=text
+        )
     except Exception as e:
         await call.message.answer("⚠️ Логотип не найден!")
     
     # Отправляем регламент
     try:
-        regulations = FSInputFile(tournament.regulations_path)
-        await bot.send_document(
-            call.from_user.id,
-            document=regulations,
+        tournament.regulations_file_id = await send_media(
+            partial(bot.send_document, call.from_user.id),
+            tournament.regulations_file_id,
+            tournament.regulations_path,
             caption="📄 Регламент турнира",
         )
         await call.message.answer(
@@ -168,22 +199,31 @@ async def view_pending_tournament(call: CallbackQuery, session: AsyncSession, bo
         )
     except Exception as e:
         await call.message.answer("⚠️ Регламент не найден!")
+    await session.commit()
+
+async def set_tournament_status(session: AsyncSession, tournament_id: int, new_status: TournamentStatus) -> Tournament | None:
+    """Смена статуса (только из PENDING) и уведомление создателя одной транзакцией"""
+    tournament = await transition_status(session, Tournament, tournament_id, new_status)
+    if not tournament:
+        return None
+    creator = await session.get(User, tournament.created_by)
+    if new_status == TournamentStatus.APPROVED:
+        add_notification(session, creator.telegram_id, f"🎉 Ваш турнир «{tournament.name}» одобрен!")
+        mark_tournaments_changed(session, tournament.format_id)
+    else:
+        add_notification(session, creator.telegram_id, f"❌ Ваш турнир «{tournament.name}» отклонен!")
+    return tournament
 
 @router.callback_query(F.data.startswith("approve_tournament_"))
 async def approve_tournament(call: CallbackQuery, session: AsyncSession):
     tournament_id = int(call.data.split("_")[2])
-    tournament = await session.get(Tournament, tournament_id)
-    
-    # Обновляем статус
-    tournament.status = TournamentStatus.APPROVED
-    await session.commit()
-    
-    # Уведомляем создателя
-    creator = await session.get(User, tournament.created_by)
-    await call.message.bot.send_message(
-        creator.telegram_id,
-        f"🎉 Ваш турнир «{tournament.name}» одобрен!"
+    tournament = await db_writer.run(
+        session, partial(set_tournament_status, tournament_id=tournament_id, new_status=TournamentStatus.APPROVED)
     )
+    if not tournament:
+        await call.answer("Турнир не найден или уже обработан!", show_alert=True)
+        await call.message.delete()
+        return
     
     # Удаляем сообщение с кнопками и показываем уведомление
     await call.message.delete()  # Удаляем сообщение с кнопками
@@ -192,16 +232,13 @@ async def approve_tournament(call: CallbackQuery, session: AsyncSession):
 @router.callback_query(F.data.startswith("reject_tournament_"))
 async def reject_tournament(call: CallbackQuery, session: AsyncSession):
     tournament_id = int(call.data.split("_")[2])
-    tournament = await session.get(Tournament, tournament_id)
-    
-    tournament.status = TournamentStatus.REJECTED
-    await session.commit()
-    
-    creator = await session.get(User, tournament.created_by)
-    await call.message.bot.send_message(
-        creator.telegram_id,
-        f"❌ Ваш турнир «{tournament.name}» отклонен!"
+    tournament = await db_writer.run(
+        session, partial(set_tournament_status, tournament_id=tournament_id, new_status=TournamentStatus.REJECTED)
     )
+    if not tournament:
+        await call.answer("Турнир не найден или уже обработан!", show_alert=True)
+        await call.message.delete()
+        return
     
     await call.message.delete()  # Удаляем сообщение с кнопками
     await call.answer("❌ Турнир отклонен!", show_alert=True)
\ No newline at end of file
@@ -1,41 +1,49 @@
+from functools import partial
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.states import RegisterTeam
-from app.services.file_handling import save_file
+from app.services.file_handling import store_media, send_media, release_file
 from app.database import crud
-from app.database.db import TournamentStatus, TeamStatus
-from app.services.notifications import notify_super_admins
+from app.database.writer import db_writer
+from app.services.catalog import catalog
+from app.services.tournament_pages import tournament_pages
+from app.database.db import TeamStatus
+from app.services.notifications import notify_super_admins, notify_team_status
 from app.states import EditTeam
-import os
 
 # Импорты клавиатур
 from app.keyboards.user import (
-    games_list_kb,
     tournament_details_kb,
     my_team_actions_kb,
     edit_team_menu_kb,
-    main_menu_kb,
-    captain_groups_url_kb
+    main_menu_kb
     
 )
 from app.keyboards.admin import team_request_kb, team_request_preview_kb
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from app.database.db import User, Game, Tournament, GameFormat, Team, Player
+from app.database.db import Tournament, Team, Player
 
 
 
 router = Router()
 
+def not_found_text(usernames: list[str]) -> str:
+    """Сообщение о незарегистрированных участниках"""
+    if len(usernames) == 1:
+        return f"Пользователь @{usernames[0]} не найден! Пусть он сначала напишет боту /start."
+    names = ", ".join(f"@{name}" for name in usernames)
+    return f"Пользователи не найдены: {names}! Пусть они сначала напишут боту /start."
+
 @router.message(F.text == "🔍 Активные турниры")
-async def show_games(message: Message, session: AsyncSession):
+async def show_games(message: Message):
     """Показ списка игр"""
-    games = await session.scalars(select(Game))
+    games = await catalog.get()
     await message.answer(
         "🎮 Выберите игру:", 
-        reply_markup=games_list_kb(games)  # Исправлено название
+        reply_markup=games.user_games_kb
     )
 
 @router.callback_query(F.data.startswith("view_tournament_"))
@@ -57,27 +65,16 @@ async def show_tournament_info(call: CallbackQuery, session: AsyncSession):
     )
     
 @router.callback_query(F.data.startswith("user_select_game_"))
-async def show_formats(call: CallbackQuery, session: AsyncSession, state: FSMContext):
+async def show_formats(call: CallbackQuery, state: FSMContext):
     game_id = int(call.data.split("_")[3])
-    formats = await session.scalars(
-        select(GameFormat).where(GameFormat.game_id == game_id)
-    )
-    formats = list(formats)
-    if not formats:
+    games = await catalog.get()
+    if not games.formats(game_id):
         await call.answer("Нет форматов для этой игры!", show_alert=True)
         return
 
-    # Клавиатура с форматами
-    builder = InlineKeyboardBuilder()
-    for fmt in formats:
-        builder.button(
-            text=f"{fmt.format_name} (до {fmt.max_players_per_team})",
-            callback_data=f"user_select_format_{fmt.id}"
-        )
-    builder.adjust(1)
     await call.message.edit_text(
         "Выберите формат:",
-        reply_markup=builder.as_markup()
+        reply_markup=games.user_formats_kb[game_id]
     )
     await state.update_data(game_id=game_id)
 
@@ -101,31 +98,25 @@ async def start_team_registration(call: CallbackQuery, state: FSMContext, sessio
 @router.callback_query(F.data.startswith("user_select_format_"))
 async def show_tournaments_by_format(call: CallbackQuery, session: AsyncSession, state: FSMContext):
     format_id = int(call.data.split("_")[3])
-    tournaments = await session.scalars(
-        select(Tournament)
-        .where(Tournament.format_id == format_id)
-        .where(Tournament.is_active == True)
-        .where(Tournament.status == TournamentStatus.APPROVED)
-    )
-    tournaments = list(tournaments)
-    if not tournaments:
+    page = await tournament_pages.get(session, format_id, 0)
+    if not page:
         await call.answer("Нет активных турниров для этого формата!", show_alert=True)
         return
 
-    # Клавиатура с турнирами
-    builder = InlineKeyboardBuilder()
-    for t in tournaments:
-        builder.button(
-            text=t.name,
-            callback_data=f"user_view_tournament_{t.id}"
-        )
-    builder.adjust(1)
-    await call.message.edit_text(
-        "Выберите турнир:",
-        reply_markup=builder.as_markup()
-    )
+    await call.message.edit_text("Выберите турнир:", reply_markup=page.markup)
     await state.update_data(format_id=format_id)
 
+@router.callback_query(F.data.startswith("user_tournaments_page_"))
+async def show_tournaments_page(call: CallbackQuery, session: AsyncSession):
+    _, _, _, format_id, number = call.data.split("_")
+    page = await tournament_pages.get(session, int(format_id), int(number))
+    if not page:
+        await call.answer("Нет активных турниров для этого формата!", show_alert=True)
+        return
+
+    await call.message.edit_text(f"Выберите турнир (стр. {page.number + 1}):", reply_markup=page.markup)
+    await call.answer()
+
 @router.callback_query(F.data.startswith("user_view_tournament_"))
 async def show_tournament_and_register(call: CallbackQuery, state: FSMContext, session: AsyncSession):
     tournament_id = int(call.data.split("_")[3])
@@ -138,26 +129,29 @@ async def show_tournament_and_register(call: CallbackQuery, state: FSMContext, s
         return
 
     # 1. Отправляем фото, если есть
-    if tournament.logo_path and os.path.exists(tournament.logo_path):
+    if tournament.logo_file_id or tournament.logo_path:
         try:
-            logo = FSInputFile(tournament.logo_path)
-            await call.message.answer_photo(
-                photo=logo,
+            tournament.logo_file_id = await send_media(
+                call.message.answer_photo,
+                tournament.logo_file_id,
+                tournament.logo_path,
                 caption=f"Логотип турнира: {tournament.name}"
             )
         except Exception:
             pass
 
     # 2. Отправляем регламент, если есть
-    if tournament.regulations_path and os.path.exists(tournament.regulations_path):
+    if tournament.regulations_file_id or tournament.regulations_path:
         try:
-            regulations = FSInputFile(tournament.regulations_path)
-            await call.message.answer_document(
-                document=regulations,
+            tournament.regulations_file_id = await send_media(
+                call.message.answer_document,
+                tournament.regulations_file_id,
+                tournament.regulations_path,
                 caption="📄 Регламент турнира"
             )
         except Exception:
             pass
+    await session.commit()
 
     # 3. Описание и кнопки — последним сообщением (кнопки будут внизу)
     text = (
@@ -186,10 +180,11 @@ async def process_team_name(message: Message, state: FSMContext):
     await state.set_state(RegisterTeam.TEAM_LOGO)
 
 @router.message(RegisterTeam.TEAM_LOGO, F.photo)
-async def process_team_logo(message: Message, state: FSMContext, bot: Bot):
-    file_id = message.photo[-1].file_id
-    file_path = await save_file(bot, file_id, "teams/logos")
-    await state.update_data(logo_path=file_path)
+async def process_team_logo(message: Message, state: FSMContext, bot: Bot, session: AsyncSession):
+    photo = message.photo[-1]
+    file_id = photo.file_id
+    file_path = await store_media(bot, file_id, "teams/logos", session, photo.file_unique_id)
+    await state.update_data(logo_path=file_path, logo_file_id=file_id)
     await message.answer("Введите участников через запятую (@user1, @user2, ...):\n(Вы — капитан, себя не указывайте)")
     await state.set_state(RegisterTeam.ADD_PLAYERS)
 
@@ -198,7 +193,7 @@ async def process_players(message: Message, state: FSMContext, session: AsyncSes
     """Обработка списка игроков по username"""
     data = await state.get_data()
     tournament = await session.get(Tournament, data['tournament_id'])
-    format = await session.get(GameFormat, tournament.format_id)
+    format = (await catalog.get()).format(tournament.format_id)
 
     usernames = [u.strip().replace("@", "") for u in message.text.split(",") if u.strip()]
     players = []
@@ -210,14 +205,12 @@ async def process_players(message: Message, state: FSMContext, session: AsyncSes
         if not usernames:
             await message.answer("❌ Введите хотя бы одного участника через запятую, например: @user1, @user2")
             return
-        for username in usernames:
-            user = await session.scalar(select(User).where(User.username == username))
-            if not user:
-                await message.answer(f"Пользователь @{username} не найден! Пусть он сначала напишет боту /start.")
-                return
-            players.append(user.telegram_id)
-        # Добавляем капитана (создателя команды)
-        players.insert(0, message.from_user.id)
+        found, missing = await crud.resolve_usernames(session, usernames)
+        if missing:
+            await message.answer(not_found_text(missing))
+            return
+        # Капитан (создатель команды) — первым
+        players = [message.from_user.id] + [tg_id for tg_id in found if tg_id != message.from_user.id]
 
     # Проверяем лимит игроков
     if len(players) > format.max_players_per_team:
@@ -229,19 +222,21 @@ async def process_players(message: Message, state: FSMContext, session: AsyncSes
         "tournament_id": data['tournament_id'],
         "captain_tg_id": message.from_user.id,
         "team_name": data['team_name'],
-        "logo_path": data['logo_path']
+        "logo_path": data['logo_path'],
+        "logo_file_id": data.get('logo_file_id')
     }
-    team = await crud.create_team(session, team_data)
-    await crud.add_players_to_team(session, team.id, players)
-
-    # Уведомление организатора и супер-админов
-    creator = await session.get(User, tournament.created_by)
-    await notify_super_admins(
-        bot=bot,
-        text=f"Новая команда зарегистрирована на турнир {tournament.name}!",
-        session=session,
-        reply_markup=team_request_preview_kb(team.id)
-    )
+    # Команда, состав и уведомления — одной транзакцией
+    async def save_team(write_session: AsyncSession) -> Team:
+        team = await crud.register_team(write_session, team_data, players)
+        # Уведомление супер-админов
+        await notify_super_admins(
+            text=f"Новая команда зарегистрирована на турнир {tournament.name}!",
+            session=write_session,
+            reply_markup=team_request_preview_kb(team.id)
+        )
+        return team
+
+    await db_writer.run(session, save_team)
 
     await message.answer("Заявка отправлена организатору турнира и админам. Ожидайте подтверждения.")
     await state.clear()
@@ -280,63 +275,51 @@ async def my_teams(message: Message, session: AsyncSession):
 @router.callback_query(F.data.startswith("my_team_"))
 async def show_my_team(call: CallbackQuery, session: AsyncSession):
     team_id = int(call.data.split("_")[2])
-    team = await session.get(Team, team_id)
-    if not team:
+    card = await crud.get_team_card(session, team_id)
+    if not card:
         await call.answer("Команда не найдена", show_alert=True)
         return
+    team, tournament = card.team, card.tournament
     # Проверка статуса
     if team.status == TeamStatus.REJECTED:
         await call.answer("Эта команда была отклонена и недоступна для просмотра.", show_alert=True)
         await call.message.delete()
         return
 
-    tournament = await session.get(Tournament, team.tournament_id)
-    players = await session.scalars(select(Player).where(Player.team_id == team.id))
-    players = list(players)
-    player_usernames = []
-    for player in players:
-        user = await session.scalar(select(User).where(User.telegram_id == player.user_id))
-        if user:
-            player_usernames.append(f"@{user.username or user.telegram_id}")
     is_captain = team.captain_tg_id == call.from_user.id
 
     # Формируем текст
-    captain = await session.scalar(select(User).where(User.telegram_id == team.captain_tg_id))
-    if captain and captain.username:
-        captain_info = f"@{captain.username}"
-    elif captain and captain.full_name:
-        captain_info = captain.full_name
-    else:
-        captain_info = str(team.captain_tg_id)
-
     text = (
         f"🏅 <b>{team.team_name}</b>\n"
         f"Турнир: <b>{tournament.name if tournament else team.tournament_id}</b>\n"
-        f"Капитан: {captain_info}\n"
-        f"Участники: {', '.join(player_usernames)}"
+        f"Капитан: {card.captain_info}\n"
+        f"Участники: {', '.join(card.player_names)}"
     )
 
     # 1. Отправляем лого, если есть
-    if team.logo_path:
+    if team.logo_file_id or team.logo_path:
         try:
-            logo = FSInputFile(team.logo_path)
-            await call.message.answer_photo(
-                photo=logo,
+            team.logo_file_id = await send_media(
+                call.message.answer_photo,
+                team.logo_file_id,
+                team.logo_path,
                 caption=f"Логотип команды: {team.team_name}"
             )
         except Exception:
             await call.message.answer("⚠️ Логотип команды не найден!")
 
     # 2. Отправляем регламент турнира, если есть
-    if tournament and tournament.regulations_path:
+    if tournament and (tournament.regulations_file_id or tournament.regulations_path):
         try:
-            regulations = FSInputFile(tournament.regulations_path)
-            await call.message.answer_document(
-                document=regulations,
+            tournament.regulations_file_id = await send_media(
+                call.message.answer_document,
+                tournament.regulations_file_id,
+                tournament.regulations_path,
                 caption="📄 Регламент турнира"
             )
         except Exception:
             await call.message.answer("⚠️ Регламент турнира не найден!")
+    await session.commit()
 
     # 3. Описание и кнопки — последним сообщением (кнопки будут внизу)
     await call.message.answer(
@@ -346,57 +329,49 @@ async def show_my_team(call: CallbackQuery, session: AsyncSession):
     )
 
 @router.callback_query(F.data == "back_to_games")
-async def back_to_games(call: CallbackQuery, session: AsyncSession):
-    games = await session.scalars(select(Game))
+async def back_to_games(call: CallbackQuery):
+    games = await catalog.get()
     await call.message.edit_text(
         "🎮 Выберите игру:",
-        reply_markup=games_list_kb(games)
+        reply_markup=games.user_games_kb
     )
 
+async def answer_team_not_pending(call: CallbackQuery, session: AsyncSession, team_id: int):
+    """Ответ, когда смена статуса не удалась: команды нет или заявка уже обработана"""
+    await session.rollback()
+    if not await session.get(Team, team_id):
+        await call.answer("Команда не найдена", show_alert=True)
+        return
+    await call.answer("Заявка уже обработана!", show_alert=True)
+    await call.message.delete()
+
+async def set_team_status(session: AsyncSession, team_id: int, new_status: TeamStatus) -> Team | None:
+    """Решение по заявке и уведомление капитану — одной транзакцией"""
+    # Только если заявка ещё не обработана (защита от двойного нажатия)
+    team = await crud.transition_status(session, Team, team_id, new_status)
+    if team:
+        notify_team_status(session, team.captain_tg_id, team.team_name, team.status)
+    return team
+
 @router.callback_query(F.data.startswith("approve_team_"))
 async def approve_team(call: CallbackQuery, session: AsyncSession, bot: Bot):
     team_id = int(call.data.split("_")[2])
-    team = await session.get(Team, team_id)
+    team = await db_writer.run(session, partial(set_team_status, team_id=team_id, new_status=TeamStatus.APPROVED))
     if not team:
-        await call.answer("Команда не найдена", show_alert=True)
-        return
-    # Проверка, что команда ещё не обработана
-    if team.status != TeamStatus.PENDING:
-        await call.answer("Заявка уже обработана!", show_alert=True)
-        await call.message.delete()
+        await answer_team_not_pending(call, session, team_id)
         return
-    team.status = TeamStatus.APPROVED
-    await session.commit()
     await call.answer("Команда одобрена!")
     await call.message.delete()
-    # Уведомление капитану
-    await bot.send_message(
-        team.captain_tg_id,
-        f"🎉 Ваша команда '{team.team_name}' одобрена для участия в турнире! Вы приглашены в группу капитанов команд",
-        reply_markup=captain_groups_url_kb()
-    )
 
 @router.callback_query(F.data.startswith("reject_team_"))
 async def reject_team(call: CallbackQuery, session: AsyncSession, bot: Bot):
     team_id = int(call.data.split("_")[2])
-    team = await session.get(Team, team_id)
+    team = await db_writer.run(session, partial(set_team_status, team_id=team_id, new_status=TeamStatus.REJECTED))
     if not team:
-        await call.answer("Команда не найдена", show_alert=True)
+        await answer_team_not_pending(call, session, team_id)
         return
-    # Проверка, что команда ещё не обработана
-    if team.status != TeamStatus.PENDING:
-        await call.answer("Заявка уже обработана!", show_alert=True)
-        await call.message.delete()
-        return
-    team.status = TeamStatus.REJECTED
-    await session.commit()
     await call.answer("Команда отклонена.")
     await call.message.delete()
-    # Уведомление капитану
-    await bot.send_message(
-        team.captain_tg_id,
-        f"❌ Ваша команда '{team.team_name}' отклонена организатором турнира."
-    )
 
 @router.callback_query(F.data.startswith("delete_team_"))
 async def delete_team(call: CallbackQuery, session: AsyncSession):
@@ -408,10 +383,13 @@ async def delete_team(call: CallbackQuery, session: AsyncSession):
     if team.captain_tg_id != call.from_user.id:
         await call.answer("Только капитан может удалить команду!", show_alert=True)
         return
-    if team.logo_path and os.path.exists(team.logo_path):
-        os.remove(team.logo_path)
-    await session.delete(team)
-    await session.commit()
+    async def remove_team(write_session: AsyncSession):
+        team = await write_session.get(Team, team_id)
+        if team:
+            await release_file(write_session, team.logo_path)
+            await write_session.delete(team)
+
+    await db_writer.run(session, remove_team)
 
     # После удаления показываем обновлённый список команд
     teams = await session.scalars(
@@ -500,8 +478,14 @@ async def process_edit_team_name(message: Message, state: FSMContext, session: A
         await message.answer("Только капитан может редактировать команду!")
         await state.clear()
         return
-    team.team_name = message.text
-    await session.commit()
+    team_id, team_name = team.id, message.text
+
+    async def rename_team(write_session: AsyncSession):
+        team = await write_session.get(Team, team_id)
+        if team:
+            team.team_name = team_name
+
+    await db_writer.run(session, rename_team)
     await message.answer("Название команды обновлено!")
     await state.clear()
     
@@ -520,9 +504,12 @@ async def process_edit_team_logo(message: Message, state: FSMContext, session: A
         await message.answer("Только капитан может редактировать команду!")
         await state.clear()
         return
-    file_id = message.photo[-1].file_id
-    file_path = await save_file(bot, file_id, "teams/logos")
+    photo = message.photo[-1]
+    file_id = photo.file_id
+    file_path = await store_media(bot, file_id, "teams/logos", session, photo.file_unique_id)
+    await release_file(session, team.logo_path)
     team.logo_path = file_path
+    team.logo_file_id = file_id
     await session.commit()
     await message.answer("Логотип команды обновлён!")
     await state.clear()
@@ -546,29 +533,20 @@ async def process_edit_team_players(message: Message, state: FSMContext, session
     if not usernames:
         await message.answer("❌ Введите хотя бы одного участника через запятую, например: @user1, @user2")
         return
-    players = []
-    for username in usernames:
-        user = await session.scalar(select(User).where(User.username == username))
-        if not user:
-            await message.answer(f"Пользователь @{username} не найден! Пусть он сначала напишет боту /start.")
-            return
-        players.append(user.telegram_id)
+    found, missing = await crud.resolve_usernames(session, usernames)
+    if missing:
+        await message.answer(not_found_text(missing))
+        return
     # Добавляем капитана
-    players.insert(0, message.from_user.id)
+    players = [message.from_user.id] + [tg_id for tg_id in found if tg_id != message.from_user.id]
     # Проверяем лимит игроков
     tournament = await session.get(Tournament, team.tournament_id)
-    format = await session.get(GameFormat, tournament.format_id)
+    format = (await catalog.get()).format(tournament.format_id)
     if len(players) > format.max_players_per_team:
         await message.answer(f"❌ Максимум игроков для этого формата: {format.max_players_per_team}")
         return
-    # Удаляем старых игроков и добавляем новых
-    await session.execute(
-        Player.__table__.delete().where(Player.team_id == team.id)
-    )
-    for tg_id in players:
-        player = Player(team_id=team.id, user_id=tg_id)
-        session.add(player)
-    await session.commit()
+    # Удаляем выбывших и добавляем только новых игроков
+    await db_writer.run(session, partial(crud.update_team_roster, team_id=team.id, players=players))
     await message.answer("Состав команды обновлён!")
     await state.clear()
 
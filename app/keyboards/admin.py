@@ -36,6 +36,7 @@ def tournament_actions_kb(tournament_id: int, is_active: bool) -> InlineKeyboard
     builder = InlineKeyboardBuilder()
     builder.button(text="🗑 Удалить", callback_data=f"delete_tournament_{tournament_id}")
     builder.button(text="◀️ Назад к списку", callback_data="back_to_tournaments")
+    builder.button(text="📢 Рассылка участникам", callback_data=f"broadcast_tournament_{tournament_id}")
     if is_active:
         builder.button(text="🔴 Сделать неактивным", callback_data=f"deactivate_tournament_{tournament_id}")
     else:
@@ -43,20 +44,81 @@ def tournament_actions_kb(tournament_id: int, is_active: bool) -> InlineKeyboard
     builder.adjust(2)
     return builder.as_markup()
 
-def tournaments_management_kb(tournaments) -> InlineKeyboardMarkup:
+# Фильтр статуса в списке турниров: значение в callback -> подпись
+TOURNAMENT_STATUS_FILTERS = {
+    "all": "все",
+    TournamentStatus.PENDING.value: "на модерации",
+    TournamentStatus.APPROVED.value: "одобренные",
+    TournamentStatus.REJECTED.value: "отклонённые",
+}
+
+def parse_cursor(token: str) -> tuple[int | None, int | None]:
+    """Курсор страницы из callback: "a<id>" — после id, "b<id>" — перед id, "" — первая страница"""
+    if token.startswith("a"):
+        return int(token[1:]), None
+    if token.startswith("b"):
+        return None, int(token[1:])
+    return None, None
+
+def add_pager(builder: InlineKeyboardBuilder, prefix: str, page) -> None:
+    """Кнопки листания для страницы crud.keyset_page"""
+    navigation = []
+    if page.has_prev and page.rows:
+        navigation.append(InlineKeyboardButton(text="◀️", callback_data=f"{prefix}_b{page.rows[0].id}"))
+    if page.has_next and page.rows:
+        navigation.append(InlineKeyboardButton(text="▶️", callback_data=f"{prefix}_a{page.rows[-1].id}"))
+    if navigation:
+        builder.row(*navigation)
+
+def tournaments_management_kb(
+    page,
+    status: str,
+    game_id: int,
+    game_name: str | None,
+    next_game_id: int,
+    status_filter: bool
+) -> InlineKeyboardMarkup:
+    """Страница турниров с фильтрами: callback tlist_{статус}_{игра}_{курсор}"""
     builder = InlineKeyboardBuilder()
-    for t in tournaments:
-        status = "🔄" if t.status == TournamentStatus.PENDING else "✅"
-        builder.button(
-            text=f"{t.name} {status}",
-            callback_data=f"edit_tournament_{t.id}"
-        )
+    filters = []
+    if status_filter:
+        statuses = list(TOURNAMENT_STATUS_FILTERS)
+        next_status = statuses[(statuses.index(status) + 1) % len(statuses)]
+        filters.append(InlineKeyboardButton(
+            text=f"Статус: {TOURNAMENT_STATUS_FILTERS[status]}",
+            callback_data=f"tlist_{next_status}_{game_id}_"
+        ))
+    filters.append(InlineKeyboardButton(
+        text=f"🎮 {game_name or 'Все игры'}",
+        callback_data=f"tlist_{status}_{next_game_id}_"
+    ))
+    builder.row(*filters)
+    for t in page.rows:
+        icon = "🔄" if t.status == TournamentStatus.PENDING else "✅"
+        builder.row(InlineKeyboardButton(text=f"{t.name} {icon}", callback_data=f"edit_tournament_{t.id}"))
+    add_pager(builder, f"tlist_{status}_{game_id}", page)
     builder.row(
         InlineKeyboardButton(text="➕ Создать", callback_data="create_tournament"),
         InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_admin"),
         width=2
     )
-    builder.adjust(1)
+    return builder.as_markup()
+
+def pending_teams_kb(page, game_id: int, game_name: str | None, next_game_id: int) -> InlineKeyboardMarkup:
+    """Страница заявок на модерации: callback pteams_{игра}_{курсор}"""
+    builder = InlineKeyboardBuilder()
+    builder.row(InlineKeyboardButton(
+        text=f"🎮 {game_name or 'Все игры'}",
+        callback_data=f"pteams_{next_game_id}_"
+    ))
+    for team in page.rows:
+        builder.row(InlineKeyboardButton(
+            text=f"{team.team_name} (турнир ID: {team.tournament_id})",
+            callback_data=f"moderate_team_{team.id}"
+        ))
+    add_pager(builder, f"pteams_{game_id}", page)
+    builder.row(InlineKeyboardButton(text="☑️ Массовая модерация", callback_data="bulk_moderation"))
+    builder.row(InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_admin"))
     return builder.as_markup()
 
 def back_to_admin_kb() -> InlineKeyboardMarkup:
@@ -71,6 +133,17 @@ def games_select_kb(games):
             text=game.name, 
             callback_data=f"admin_select_game_{game.id}"  # Новый префикс
         )
+    builder.adjust(1)
+    return builder.as_markup()
+
+def formats_select_kb(formats):
+    builder = InlineKeyboardBuilder()
+    for fmt in formats:
+        builder.button(
+            text=f"{fmt.format_name} (до {fmt.max_players_per_team})",
+            callback_data=f"admin_select_format_{fmt.id}"
+        )
+    builder.adjust(1)
     return builder.as_markup()
 
 def confirm_action_kb(tournament_id: int) -> InlineKeyboardMarkup:
@@ -92,6 +165,15 @@ def confirm_action_kb(tournament_id: int) -> InlineKeyboardMarkup:
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+def broadcast_confirm_kb() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="📢 Отправить", callback_data="broadcast_confirm"),
+        InlineKeyboardButton(text="❌ Отменить", callback_data="broadcast_cancel"),
+        width=2
+    )
+    return builder.as_markup()
+
 def super_admin_menu() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.row(
@@ -102,17 +184,30 @@ def super_admin_menu() -> InlineKeyboardMarkup:
     )
     return builder.as_markup()
 
-def manage_admins_kb(admins):
+def manage_admins_kb(page):
+    """Страница админов: callback admins_{курсор}"""
     builder = InlineKeyboardBuilder()
-    for admin in admins:
+    for admin in page.rows:
         status = "👑" if admin.role == UserRole.SUPER_ADMIN else "🛡️"
-        builder.button(
+        builder.row(InlineKeyboardButton(
             text=f"{admin.full_name} {status}",
             callback_data=f"toggle_admin_{admin.id}"
-        )
-    builder.button(text="➕ Добавить админа", callback_data="add_admin")
-    builder.button(text="◀️ Назад", callback_data="back_to_super_admin")
-    builder.adjust(1)
+        ))
+    add_pager(builder, "admins", page)
+    builder.row(InlineKeyboardButton(text="➕ Добавить админа", callback_data="add_admin"))
+    builder.row(InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_super_admin"))
+    return builder.as_markup()
+
+def pending_tournaments_kb(page):
+    """Страница турниров на модерации: callback ptournaments_{курсор}"""
+    builder = InlineKeyboardBuilder()
+    for tournament in page.rows:
+        builder.row(InlineKeyboardButton(
+            text=tournament.name,
+            callback_data=f"view_pending_tournament_{tournament.id}"
+        ))
+    add_pager(builder, "ptournaments", page)
+    builder.row(InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_super_admin"))
     return builder.as_markup()
 
 def back_to_super_admin_kb():
@@ -135,11 +230,32 @@ def moderation_actions_kb(tournament_id: int) -> InlineKeyboardMarkup:
     )
     return builder.as_markup()
 
-def team_request_kb(team_id: int):
+def team_request_kb(team_id: int, tournament_id: int | None = None):
     builder = InlineKeyboardBuilder()
     builder.button(text="✅ Одобрить", callback_data=f"approve_team_{team_id}")
     builder.button(text="❌ Отклонить", callback_data=f"reject_team_{team_id}")
-    builder.adjust(2)
+    if tournament_id is not None:
+        builder.button(text="✅ Одобрить все заявки турнира", callback_data=f"bulk_approve_tournament_{tournament_id}")
+        builder.button(text="❌ Отклонить все заявки турнира", callback_data=f"bulk_reject_tournament_{tournament_id}")
+    builder.adjust(2, 1, 1)
+    return builder.as_markup()
+
+def bulk_moderation_kb(teams, selected: set[int]) -> InlineKeyboardMarkup:
+    """Мультивыбор заявок: teams — [(team_id, team_name, tournament_id), ...]"""
+    builder = InlineKeyboardBuilder()
+    for team_id, team_name, tournament_id in teams:
+        mark = "☑️" if team_id in selected else "⬜️"
+        builder.button(
+            text=f"{mark} {team_name} (турнир ID: {tournament_id})",
+            callback_data=f"bulk_toggle_{team_id}"
+        )
+    builder.adjust(1)
+    builder.row(
+        InlineKeyboardButton(text=f"✅ Одобрить ({len(selected)})", callback_data="bulk_approve"),
+        InlineKeyboardButton(text=f"❌ Отклонить ({len(selected)})", callback_data="bulk_reject"),
+        width=2
+    )
+    builder.row(InlineKeyboardButton(text="◀️ Назад", callback_data="moderate_teams"))
     return builder.as_markup()
 
 def tournament_status_kb(tournament_id: int, is_active: bool) -> InlineKeyboardMarkup:
@@ -152,9 +268,11 @@ def tournament_status_kb(tournament_id: int, is_active: bool) -> InlineKeyboardM
     builder.adjust(1)
     return builder.as_markup()
 
-def team_request_preview_kb(team_id: int) -> InlineKeyboardMarkup:
+def team_requests_digest_kb(teams: list[tuple[int, str]]) -> InlineKeyboardMarkup:
+    """Кнопки просмотра для сводки заявок: [(team_id, team_name), ...]"""
     builder = InlineKeyboardBuilder()
-    builder.button(text="👁 Посмотреть команду", callback_data=f"preview_team_{team_id}")
+    for team_id, team_name in teams:
+        builder.button(text=f"👁 {team_name}", callback_data=f"preview_team_{team_id}")
     builder.adjust(1)
     return builder.as_markup()
 
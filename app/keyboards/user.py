@@ -30,6 +30,16 @@ def games_list_kb(games):
         )
     return builder.as_markup()
 
+def formats_list_kb(formats):
+    builder = InlineKeyboardBuilder()
+    for fmt in formats:
+        builder.button(
+            text=f"{fmt.format_name} (до {fmt.max_players_per_team})",
+            callback_data=f"user_select_format_{fmt.id}"
+        )
+    builder.adjust(1)
+    return builder.as_markup()
+
 def tournaments_list_kb(tournaments: list) -> InlineKeyboardMarkup:
     """Список турниров для выбранной игры"""
     builder = InlineKeyboardBuilder()
@@ -44,6 +54,23 @@ def tournaments_list_kb(tournaments: list) -> InlineKeyboardMarkup:
     )
     return builder.as_markup()
 
+def tournaments_page_kb(format_id: int, tournaments: list, page: int, has_next: bool) -> InlineKeyboardMarkup:
+    """Страница турниров формата с листанием"""
+    builder = InlineKeyboardBuilder()
+    for tournament in tournaments:
+        builder.row(InlineKeyboardButton(
+            text=tournament.name,
+            callback_data=f"user_view_tournament_{tournament.id}"
+        ))
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(text="◀️", callback_data=f"user_tournaments_page_{format_id}_{page - 1}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton(text="▶️", callback_data=f"user_tournaments_page_{format_id}_{page + 1}"))
+    if navigation:
+        builder.row(*navigation)
+    return builder.as_markup()
+
 def tournament_details_kb(tournament_id: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.row(
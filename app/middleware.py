@@ -5,13 +5,55 @@ from sqlalchemy import select
 from app.database.db import User, UserRole
 from typing import Callable, Awaitable, Dict, Any
 import logging
+import time
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
 from app.keyboards.user import subscription_kb
+from app.services.membership import get_missing_channels, refresh_missing_channels
+from app.services import metrics
+from app.services.user_cache import resolve_user
 import os
 from dotenv import load_dotenv
 load_dotenv()
 logger = logging.getLogger(__name__)
 REQUIRED_CHANNELS = [ch.strip() for ch in os.getenv("REQUIRED_CHANNELS", "").split(",") if ch.strip()]
+# Повторное нажатие той же кнопки в течение окна (сек) считается дублем
+CALLBACK_DEDUP_WINDOW = float(os.getenv("CALLBACK_DEDUP_WINDOW", "2"))
+# Кнопки, меняющие данные: для них окно действует и после завершения обработки.
+# Остальные (навигация, страницы, "Проверить подписку") отсекаются, только пока
+# то же нажатие ещё обрабатывается
+CALLBACK_DEDUP_MUTATING = (
+    "approve_",
+    "reject_",
+    "delete_",
+    "activate_tournament_",
+    "deactivate_tournament_",
+    "toggle_admin_",
+    "bulk_approve",
+    "bulk_reject",
+    "broadcast_confirm",
+)
+class LazySession:
+    """Обёртка над AsyncSession: сессия открывается при первом обращении"""
+    __slots__ = ("_session_maker", "_session")
+
+    def __init__(self, session_maker):
+        self._session_maker = session_maker
+        self._session: AsyncSession | None = None
+
+    @property
+    def is_opened(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._session_maker()
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
 class DatabaseMiddleware(BaseMiddleware):
     def __init__(self, session_maker):
         self.session_maker = session_maker
@@ -22,9 +64,57 @@ class DatabaseMiddleware(BaseMiddleware):
         event: Any,
         data: Dict[str, Any]
     ) -> Any:
-        async with self.session_maker() as session:
-            data["session"] = session
+        session = LazySession(self.session_maker)
+        data["session"] = session
+        try:
             return await handler(event, data)
+        finally:
+            if session.is_opened:
+                await session.close()
+            else:
+                metrics.inc("updates_without_db")
+
+class CurrentUserMiddleware(BaseMiddleware):
+    """Загружает пользователя БД один раз на апдейт (data["current_user"])"""
+    async def __call__(self, handler, event, data):
+        from_user = data.get("event_from_user")
+        data["current_user"] = (
+            await resolve_user(data["session"], from_user.id) if from_user else None
+        )
+        return await handler(event, data)
+
+class CallbackDedupMiddleware(BaseMiddleware):
+    """Отбрасывает повторные нажатия кнопки, пока первое обрабатывается,
+    а для кнопок, меняющих данные, — и сразу после"""
+    def __init__(self, window: float = CALLBACK_DEDUP_WINDOW):
+        self.window = window
+        self._in_flight: set[tuple[int, str]] = set()
+        self._finished: dict[tuple[int, str], float] = {}
+
+    async def __call__(self, handler, event: CallbackQuery, data):
+        key = (event.from_user.id, event.data or "")
+        now = time.monotonic()
+        finished_at = self._finished.get(key)
+        recently = finished_at is not None and now - finished_at < self.window
+        if key in self._in_flight or recently:
+            metrics.inc("callbacks_deduplicated")
+            await event.answer("⏳ Уже обрабатывается")
+            return
+        self._in_flight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight.discard(key)
+            if key[1].startswith(CALLBACK_DEDUP_MUTATING):
+                self._remember_finished(key)
+
+    def _remember_finished(self, key: tuple[int, str]) -> None:
+        finished = time.monotonic()
+        self._finished[key] = finished
+        if len(self._finished) > 10000:
+            self._finished = {
+                k: t for k, t in self._finished.items() if finished - t < self.window
+            }
 
 class ErrorHandlerMiddleware(BaseMiddleware):
     async def __call__(self, handler, event, data):
@@ -50,14 +140,11 @@ class SubscriptionMiddleware(BaseMiddleware):
         elif isinstance(event, CallbackQuery):
             user_id = event.from_user.id
         if user_id:
-            not_subscribed = []
-            for channel in REQUIRED_CHANNELS:
-                try:
-                    member = await bot.get_chat_member(channel, user_id)
-                    if member.status not in ("member", "administrator", "creator"):
-                        not_subscribed.append(channel)
-                except Exception:
-                    not_subscribed.append(channel)
+            # Кнопка "Проверить подписку" всегда идёт мимо индекса и кэша
+            if isinstance(event, CallbackQuery) and event.data == "check_subscription":
+                not_subscribed = await refresh_missing_channels(bot, data["session"], user_id, REQUIRED_CHANNELS)
+            else:
+                not_subscribed = await get_missing_channels(bot, user_id, REQUIRED_CHANNELS)
             if not_subscribed:
                 channels_list = "\n".join([f"• {ch}" for ch in not_subscribed])
                 text = (
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import os
+from aiogram import Bot
+from dotenv import load_dotenv
+from sqlalchemy import select, union, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.db import (
+    Broadcast, BroadcastStatus, Team, TeamStatus, Player, async_session_maker
+)
+from app.services import metrics
+from app.services.outbound import outbound
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Получателей за шаг: столько сообщений одновременно стоит в очереди отправки
+BROADCAST_CHUNK = int(os.getenv("BROADCAST_CHUNK", "100"))
+
+# Ссылки на запущенные рассылки, чтобы задачи не собрал GC
+_tasks: set[asyncio.Task] = set()
+
+
+def recipients_subquery(tournament_id: int):
+    """Капитаны и игроки одобренных команд турнира (без повторов)"""
+    captains = (
+        select(Team.captain_tg_id.label("telegram_id"))
+        .where(Team.tournament_id == tournament_id, Team.status == TeamStatus.APPROVED)
+    )
+    players = (
+        select(Player.user_id.label("telegram_id"))
+        .join(Team, Team.id == Player.team_id)
+        .where(Team.tournament_id == tournament_id, Team.status == TeamStatus.APPROVED)
+    )
+    return union(captains, players).subquery()
+
+
+async def count_recipients(session: AsyncSession, tournament_id: int) -> int:
+    recipients = recipients_subquery(tournament_id)
+    return await session.scalar(select(func.count()).select_from(recipients))
+
+
+async def _next_chunk(broadcast: Broadcast) -> list[int]:
+    # Keyset по telegram_id: короткий запрос на каждый шаг вместо долгой читающей транзакции
+    recipients = recipients_subquery(broadcast.tournament_id)
+    async with async_session_maker() as session:
+        result = await session.scalars(
+            select(recipients.c.telegram_id)
+            .where(recipients.c.telegram_id > broadcast.cursor)
+            .order_by(recipients.c.telegram_id)
+            .limit(BROADCAST_CHUNK)
+        )
+        return list(result)
+
+
+def _progress_text(broadcast: Broadcast, done: bool = False) -> str:
+    title = "✅ Рассылка завершена" if done else "📢 Рассылка идёт..."
+    return (
+        f"{title}\n"
+        f"Доставлено: {broadcast.sent}\n"
+        f"Ошибок: {broadcast.failed}"
+    )
+
+
+async def _run(bot: Bot, broadcast_id: int) -> None:
+    async with async_session_maker() as session:
+        broadcast = await session.get(Broadcast, broadcast_id)
+    while broadcast.status == BroadcastStatus.RUNNING:
+        chunk = await _next_chunk(broadcast)
+        if chunk:
+            results = await asyncio.gather(*(
+                outbound.send_message(telegram_id, broadcast.text, parse_mode="HTML")
+                for telegram_id in chunk
+            ))
+            failed = sum(1 for error in results if error is not None)
+            broadcast.sent += len(chunk) - failed
+            broadcast.failed += failed
+            broadcast.cursor = chunk[-1]
+            metrics.inc("broadcast_sent", len(chunk) - failed)
+            metrics.inc("broadcast_failed", failed)
+        if len(chunk) < BROADCAST_CHUNK:
+            broadcast.status = BroadcastStatus.DONE
+        # Сохраняем прогресс после каждого шага — при перезапуске продолжим с cursor
+        async with async_session_maker() as session:
+            broadcast = await session.merge(broadcast)
+            await session.commit()
+        if broadcast.progress_message_id:
+            try:
+                await bot.edit_message_text(
+                    _progress_text(broadcast, done=broadcast.status == BroadcastStatus.DONE),
+                    chat_id=broadcast.admin_chat_id,
+                    message_id=broadcast.progress_message_id
+                )
+            except Exception as e:
+                logger.debug(f"Cannot update broadcast progress: {e}")
+    logger.info(f"Broadcast {broadcast_id} finished: sent={broadcast.sent}, failed={broadcast.failed}")
+
+
+async def _run_safe(bot: Bot, broadcast_id: int) -> None:
+    try:
+        await _run(bot, broadcast_id)
+    except Exception as e:
+        # Статус остаётся RUNNING — рассылка продолжится после перезапуска
+        logger.error(f"Broadcast {broadcast_id} failed: {e}", exc_info=True)
+
+
+def start_broadcast(bot: Bot, broadcast_id: int) -> None:
+    """Запуск рассылки в фоне"""
+    task = asyncio.create_task(_run_safe(bot, broadcast_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def resume_broadcasts(bot: Bot) -> None:
+    """Продолжение незавершённых рассылок после перезапуска"""
+    async with async_session_maker() as session:
+        running = await session.scalars(
+            select(Broadcast.id).where(Broadcast.status == BroadcastStatus.RUNNING)
+        )
+        broadcast_ids = list(running)
+    for broadcast_id in broadcast_ids:
+        logger.info(f"Resuming broadcast {broadcast_id}")
+        start_broadcast(bot, broadcast_id)
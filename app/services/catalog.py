@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from itertools import chain
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.database.db import Game, GameFormat, async_session_maker
+from app.keyboards.user import games_list_kb, formats_list_kb
+from app.keyboards.admin import games_select_kb, formats_select_kb
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class GameInfo:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
+class FormatInfo:
+    id: int
+    game_id: int
+    format_name: str
+    max_players_per_team: int
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Игры, форматы и готовые клавиатуры; не меняется, при перезагрузке заменяется целиком"""
+    games: tuple[GameInfo, ...]
+    games_by_id: dict[int, GameInfo]
+    formats_by_id: dict[int, FormatInfo]
+    formats_by_game: dict[int, tuple[FormatInfo, ...]]
+    user_games_kb: InlineKeyboardMarkup
+    admin_games_kb: InlineKeyboardMarkup
+    user_formats_kb: dict[int, InlineKeyboardMarkup]
+    admin_formats_kb: dict[int, InlineKeyboardMarkup]
+
+    def game(self, game_id: int) -> GameInfo | None:
+        return self.games_by_id.get(game_id)
+
+    def format(self, format_id: int) -> FormatInfo | None:
+        return self.formats_by_id.get(format_id)
+
+    def formats(self, game_id: int) -> tuple[FormatInfo, ...]:
+        return self.formats_by_game.get(game_id, ())
+
+    def next_game_id(self, game_id: int) -> int:
+        """Следующая игра для кнопки-фильтра (0 — все игры)"""
+        ids = [0] + [game.id for game in self.games]
+        return ids[(ids.index(game_id) + 1) % len(ids)] if game_id in ids else 0
+
+
+class Catalog:
+    """Справочник игр и форматов в памяти (меняется редко, читается на каждом шаге выбора)"""
+
+    def __init__(self):
+        self._snapshot: CatalogSnapshot | None = None
+        self._version = 0  # растёт при каждой инвалидации
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+        self._version += 1
+
+    async def get(self) -> CatalogSnapshot:
+        """Текущий снимок; загружается из БД только после инвалидации"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            metrics.inc("catalog_hits")
+            return snapshot
+        async with self._lock:
+            if self._snapshot is None:
+                return await self.load()
+            return self._snapshot
+
+    async def load(self) -> CatalogSnapshot:
+        version = self._version
+        async with async_session_maker() as session:
+            game_rows = (await session.execute(select(Game.id, Game.name).order_by(Game.id))).all()
+            format_rows = (await session.execute(
+                select(GameFormat.id, GameFormat.game_id, GameFormat.format_name, GameFormat.max_players_per_team)
+                .order_by(GameFormat.id)
+            )).all()
+        snapshot = self._build(
+            tuple(GameInfo(*row) for row in game_rows),
+            tuple(FormatInfo(*row) for row in format_rows)
+        )
+        # Если во время загрузки справочник изменили, снимок уже устарел
+        if version == self._version:
+            self._snapshot = snapshot
+        metrics.inc("catalog_loads")
+        logger.info(f"Catalog loaded: {len(snapshot.games)} games, {len(snapshot.formats_by_id)} formats")
+        return snapshot
+
+    @staticmethod
+    def _build(games: tuple[GameInfo, ...], formats: tuple[FormatInfo, ...]) -> CatalogSnapshot:
+        formats_by_game: dict[int, tuple[FormatInfo, ...]] = {}
+        for fmt in formats:
+            formats_by_game[fmt.game_id] = formats_by_game.get(fmt.game_id, ()) + (fmt,)
+        return CatalogSnapshot(
+            games=games,
+            games_by_id={game.id: game for game in games},
+            formats_by_id={fmt.id: fmt for fmt in formats},
+            formats_by_game=formats_by_game,
+            user_games_kb=games_list_kb(games),
+            admin_games_kb=games_select_kb(games),
+            user_formats_kb={game_id: formats_list_kb(items) for game_id, items in formats_by_game.items()},
+            admin_formats_kb={game_id: formats_select_kb(items) for game_id, items in formats_by_game.items()},
+        )
+
+
+catalog = Catalog()
+
+
+@event.listens_for(Session, "after_flush")
+def _track_catalog_changes(session: Session, flush_context) -> None:
+    changed = chain(session.new, session.dirty, session.deleted)
+    if any(isinstance(obj, (Game, GameFormat)) for obj in changed):
+        session.info["catalog_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_catalog(session: Session) -> None:
+    if session.info.pop("catalog_dirty", False):
+        catalog.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_changes(session: Session) -> None:
+    session.info.pop("catalog_dirty", None)
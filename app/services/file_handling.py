@@ -1,18 +1,272 @@
+import asyncio
+import hashlib
 import os
 import uuid
+from datetime import datetime, timedelta
 from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+from sqlalchemy import select, delete, func, update, or_, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from app.database.db import MediaFile, PendingMedia, Tournament, Team, async_session_maker
+from app.services import metrics
 import logging
 
-async def save_file(bot: Bot, file_id: str, folder: str) -> str:
-    """Сохранение файлов с обработкой ошибок"""
+load_dotenv()
+
+# eager — скачивать файл сразу, deferred — хранить только file_id, копию сделать позже
+MEDIA_STORAGE_MODE = os.getenv("MEDIA_STORAGE_MODE", "eager")
+# Как часто фоновая задача докачивает отложенные файлы (0 — не запускать)
+MEDIA_MATERIALIZE_INTERVAL = float(os.getenv("MEDIA_MATERIALIZE_INTERVAL", "300"))
+MEDIA_MATERIALIZE_BATCH = int(os.getenv("MEDIA_MATERIALIZE_BATCH", "20"))
+# После стольких неудачных попыток файл помечается как недоступный
+MEDIA_MATERIALIZE_MAX_ATTEMPTS = int(os.getenv("MEDIA_MATERIALIZE_MAX_ATTEMPTS", "5"))
+
+async def _download(bot: Bot, file, folder: str) -> str:
+    os.makedirs(f"static/{folder}", exist_ok=True)
+    ext = file.file_path.split(".")[-1]
+    filename = f"{uuid.uuid4()}.{ext}"
+    path = f"static/{folder}/{filename}"
+    await bot.download_file(file.file_path, path)
+    return path
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def save_file(
+    bot: Bot,
+    file_id: str,
+    folder: str,
+    session: AsyncSession | None = None,
+    file_unique_id: str | None = None
+) -> str:
+    """Сохранение файлов с обработкой ошибок.
+
+    С session файлы хранятся один раз: повторная загрузка того же file_unique_id
+    (или файла с тем же содержимым) только увеличивает счётчик ссылок.
+    """
     try:
-        os.makedirs(f"static/{folder}", exist_ok=True)
+        if session is None:
+            return await _download(bot, await bot.get_file(file_id), folder)
+
+        media = None
+        if file_unique_id:
+            media = await session.scalar(
+                select(MediaFile).where(MediaFile.file_unique_id == file_unique_id)
+            )
+            if media and os.path.exists(media.path):
+                media.ref_count += 1
+                await session.commit()
+                metrics.inc("media_dedup_hits")
+                return media.path
+
         file = await bot.get_file(file_id)
-        ext = file.file_path.split(".")[-1]
-        filename = f"{uuid.uuid4()}.{ext}"
-        path = f"static/{folder}/{filename}"
-        await bot.download_file(file.file_path, path)
+        if media is None:
+            media = await session.scalar(
+                select(MediaFile).where(MediaFile.file_unique_id == file.file_unique_id)
+            )
+        path = await _download(bot, file, folder)
+        metrics.inc("media_downloads")
+
+        # Тот же файл мог прийти под другим file_unique_id
+        content_hash = await asyncio.to_thread(_sha256, path)
+        same = await session.scalar(
+            select(MediaFile)
+            .where(MediaFile.content_hash == content_hash, MediaFile.path != path)
+            .limit(1)
+        )
+        downloaded = path
+        if same and os.path.exists(same.path):
+            os.remove(path)
+            path = same.path
+            downloaded = None
+            metrics.inc("media_hash_hits")
+
+        if media is not None:
+            # Запись есть, но файл пропал с диска
+            media.path = path
+            media.content_hash = content_hash
+            media.ref_count += 1
+            await session.commit()
+            return path
+
+        session.add(MediaFile(
+            file_unique_id=file.file_unique_id,
+            content_hash=content_hash,
+            path=path,
+            ref_count=1
+        ))
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Тот же файл одновременно сохранил другой обработчик — берём его запись
+            await session.rollback()
+            media = await session.scalar(
+                select(MediaFile).where(MediaFile.file_unique_id == file.file_unique_id)
+            )
+            if media is None:
+                raise
+            media.ref_count += 1
+            await session.commit()
+            if downloaded and media.path != downloaded and os.path.exists(downloaded):
+                os.remove(downloaded)
+            metrics.inc("media_dedup_hits")
+            return media.path
         return path
     except Exception as e:
         logging.error(f"Ошибка сохранения файла: {e}")
-        raise
\ No newline at end of file
+        raise
+
+async def store_media(
+    bot: Bot,
+    file_id: str,
+    folder: str,
+    session: AsyncSession,
+    file_unique_id: str | None = None
+) -> str:
+    """Путь к локальной копии файла; в режиме deferred — пустая строка (копия будет позже)"""
+    if MEDIA_STORAGE_MODE == "deferred":
+        metrics.inc("media_deferred")
+        # file_unique_id понадобится при докачке, чтобы не скачивать известный файл
+        if await session.get(PendingMedia, file_id) is None:
+            session.add(PendingMedia(file_id=file_id, file_unique_id=file_unique_id))
+            await session.commit()
+        return ""
+    return await save_file(bot, file_id, folder, session, file_unique_id)
+
+# (модель, колонка пути, колонка file_id, папка)
+_MATERIALIZE_TARGETS = (
+    (Tournament, "logo_path", "logo_file_id", "tournaments/logos"),
+    (Tournament, "regulations_path", "regulations_file_id", "tournaments/regulations"),
+    (Team, "logo_path", "logo_file_id", "teams/logos"),
+)
+
+async def _record_failure(session: AsyncSession, file_id: str, error: Exception) -> None:
+    """Учёт неудачной попытки: пауза растёт вдвое, отказ Telegram (например,
+    файл больше 20 МБ для getFile) или исчерпанные попытки — больше не пытаться"""
+    pending = await session.get(PendingMedia, file_id)
+    if pending is None:
+        pending = PendingMedia(file_id=file_id, attempts=0)
+        session.add(pending)
+    pending.attempts += 1
+    pending.last_error = str(error)[:200]
+    if isinstance(error, TelegramBadRequest) or pending.attempts >= MEDIA_MATERIALIZE_MAX_ATTEMPTS:
+        pending.failed = True
+        pending.next_attempt_at = None
+        metrics.inc("media_materialize_failed")
+    else:
+        delay = MEDIA_MATERIALIZE_INTERVAL * 2 ** (pending.attempts - 1)
+        pending.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+    await session.commit()
+
+async def materialize_pending(bot: Bot, session: AsyncSession, limit: int = MEDIA_MATERIALIZE_BATCH) -> int:
+    """Скачивание локальных копий для записей, у которых есть только file_id.
+
+    Файлы на паузе после ошибки и недоступные пропускаются, чтобы не
+    занимать пачку и не блокировать записи за ними.
+    """
+    done = 0
+    for model, path_attr, file_id_attr, folder in _MATERIALIZE_TARGETS:
+        path_col = getattr(model, path_attr)
+        file_id_col = getattr(model, file_id_attr)
+        rows = (await session.execute(
+            select(model.id, file_id_col, PendingMedia.file_unique_id)
+            .outerjoin(PendingMedia, PendingMedia.file_id == file_id_col)
+            .where(
+                path_col == "",
+                file_id_col.is_not(None),
+                or_(PendingMedia.file_id.is_(None), PendingMedia.failed == False),
+                or_(PendingMedia.next_attempt_at.is_(None), PendingMedia.next_attempt_at <= datetime.utcnow())
+            )
+            .order_by(model.id)
+            .limit(limit)
+        )).all()
+        for row_id, file_id, file_unique_id in rows:
+            try:
+                path = await save_file(bot, file_id, folder, session, file_unique_id)
+            except Exception as e:
+                logging.warning(f"Не удалось скачать {model.__name__} {row_id}: {e}")
+                await session.rollback()
+                await _record_failure(session, file_id, e)
+                continue
+            await session.execute(
+                update(model)
+                .where(model.id == row_id, path_col == "")
+                .values({path_attr: path})
+            )
+            await session.commit()
+            done += 1
+    return done
+
+async def run_media_materializer(bot: Bot) -> None:
+    """Фоновая докачка файлов в режиме deferred"""
+    while True:
+        try:
+            async with async_session_maker() as session:
+                count = await materialize_pending(bot, session)
+            if count:
+                logging.info(f"Скачано отложенных файлов: {count}")
+                metrics.inc("media_materialized", count)
+        except Exception as e:
+            logging.error(f"Ошибка фоновой докачки файлов: {e}")
+        await asyncio.sleep(MEDIA_MATERIALIZE_INTERVAL)
+
+async def release_file(session: AsyncSession, path: str | None) -> None:
+    """Освобождение ссылки на файл; файл удаляется, когда ссылок не осталось.
+
+    Коммит делает вызывающий код; с диска файл удаляется только после
+    коммита, чтобы при откате запись MediaFile не указывала на пустое место.
+    """
+    if not path:
+        return
+    media = await session.scalar(
+        select(MediaFile)
+        .where(MediaFile.path == path, MediaFile.ref_count > 0)
+        .limit(1)
+    )
+    if media is not None:
+        media.ref_count -= 1
+        remaining = await session.scalar(
+            select(func.sum(MediaFile.ref_count)).where(MediaFile.path == path)
+        )
+        if remaining:
+            return
+        await session.execute(delete(MediaFile).where(MediaFile.path == path))
+    session.info.setdefault("released_files", []).append(path)
+
+
+@event.listens_for(Session, "after_commit")
+def _remove_released_files(session: Session) -> None:
+    for path in session.info.pop("released_files", ()):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+@event.listens_for(Session, "after_rollback")
+def _keep_released_files(session: Session) -> None:
+    session.info.pop("released_files", None)
+
+
+async def send_media(send, file_id: str | None, path: str | None, **kwargs) -> str:
+    """Отправка фото/документа по сохранённому file_id, при отказе — загрузка файла.
+
+    send — метод отправки (answer_photo, answer_document, partial(bot.send_photo, chat_id)).
+    Возвращает актуальный file_id, чтобы его можно было сохранить в БД.
+    """
+    if file_id:
+        try:
+            await send(file_id, **kwargs)
+            return file_id
+        except TelegramBadRequest as e:
+            logging.warning(f"file_id отклонён, загружаем файл заново: {e}")
+    if not path or not os.path.exists(path):
+        raise FileNotFoundError(path)
+    message = await send(FSInputFile(path), **kwargs)
+    return message.photo[-1].file_id if message.photo else message.document.file_id
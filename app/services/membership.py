@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from aiogram import Bot
+from aiogram.types import Chat
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.db import ChannelMember
+from app.services import metrics
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+MEMBER_STATUSES = ("member", "administrator", "creator")
+
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "10000"))
+MEMBERSHIP_POSITIVE_TTL = float(os.getenv("MEMBERSHIP_POSITIVE_TTL", "600"))
+MEMBERSHIP_NEGATIVE_TTL = float(os.getenv("MEMBERSHIP_NEGATIVE_TTL", "30"))
+MEMBERSHIP_CHECK_TIMEOUT = float(os.getenv("MEMBERSHIP_CHECK_TIMEOUT", "3"))
+# Сколько доверять записи индекса без подтверждения через API, с
+MEMBERSHIP_INDEX_TTL = float(os.getenv("MEMBERSHIP_INDEX_TTL", "86400"))
+
+
+def is_member_status(member) -> bool:
+    """Считается ли участник подписчиком (restricted — только если ещё в канале)"""
+    if member.status == "restricted":
+        return bool(getattr(member, "is_member", False))
+    return member.status in MEMBER_STATUSES
+
+
+def match_channel(chat: Chat, channels: list[str]) -> str | None:
+    """Поиск канала из REQUIRED_CHANNELS (@username или id) по объекту чата"""
+    for channel in channels:
+        if channel.startswith("@"):
+            if chat.username and channel[1:].lower() == chat.username.lower():
+                return channel
+        elif channel == str(chat.id):
+            return channel
+    return None
+
+
+class MembershipCache:
+    """LRU-кэш подписок с отдельными TTL для положительных и отрицательных ответов"""
+
+    def __init__(self, maxsize: int, positive_ttl: float, negative_ttl: float):
+        self.maxsize = maxsize
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        # (channel, user_id) -> (is_member, expires_at)
+        self._data: OrderedDict[tuple[str, int], tuple[bool, float]] = OrderedDict()
+
+    def get(self, channel: str, user_id: int) -> bool | None:
+        key = (channel, user_id)
+        entry = self._data.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            metrics.inc("membership_cache_misses")
+            return None
+        self._data.move_to_end(key)
+        metrics.inc("membership_cache_hits")
+        return entry[0]
+
+    def get_stale(self, channel: str, user_id: int) -> bool | None:
+        """Последний известный ответ, даже если TTL истёк"""
+        entry = self._data.get((channel, user_id))
+        return entry[0] if entry else None
+
+    def set(self, channel: str, user_id: int, is_member: bool) -> None:
+        ttl = self.positive_ttl if is_member else self.negative_ttl
+        key = (channel, user_id)
+        self._data[key] = (is_member, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        # Вытесняем самые давно использованные записи
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            metrics.inc("membership_cache_evictions")
+
+    def invalidate(self, user_id: int, channels: list[str]) -> None:
+        """Сброс записей пользователя (принудительная перепроверка)"""
+        for channel in channels:
+            self._data.pop((channel, user_id), None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class MembershipIndex:
+    """Подписки, известные из апдейтов chat_member (бот — админ канала).
+
+    Апдейт может потеряться (бот был выключен, лишился прав админа), поэтому
+    записи старше ttl не используются — подписка проверяется через API.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = timedelta(seconds=ttl)
+        # channel -> {user_id: (is_member, updated_at)}
+        self._channels: dict[str, dict[int, tuple[bool, datetime]]] = {}
+
+    def get(self, channel: str, user_id: int) -> bool | None:
+        entry = self._channels.get(channel, {}).get(user_id)
+        if entry is None:
+            return None
+        if datetime.utcnow() - entry[1] > self.ttl:
+            metrics.inc("membership_index_stale")
+            return None
+        return entry[0]
+
+    async def load(self, session: AsyncSession, channels: list[str]) -> None:
+        """Загрузка индекса из БД при старте"""
+        self._channels = {channel: {} for channel in channels}
+        rows = await session.execute(
+            select(ChannelMember.channel, ChannelMember.user_id, ChannelMember.is_member, ChannelMember.updated_at)
+            .where(ChannelMember.channel.in_(channels))
+        )
+        count = 0
+        for channel, user_id, is_member, updated_at in rows:
+            self._channels[channel][user_id] = (is_member, updated_at or datetime.min)
+            count += 1
+        logger.info(f"Membership index loaded: {count} entries")
+
+    async def update(self, session: AsyncSession, channel: str, user_id: int, is_member: bool) -> None:
+        """Сохранение изменения подписки в БД и в памяти"""
+        updated_at = datetime.utcnow()
+        await session.merge(ChannelMember(
+            channel=channel,
+            user_id=user_id,
+            is_member=is_member,
+            updated_at=updated_at
+        ))
+        await session.commit()
+        self._channels.setdefault(channel, {})[user_id] = (is_member, updated_at)
+
+
+membership_index = MembershipIndex(MEMBERSHIP_INDEX_TTL)
+
+membership_cache = MembershipCache(
+    MEMBERSHIP_CACHE_SIZE,
+    MEMBERSHIP_POSITIVE_TTL,
+    MEMBERSHIP_NEGATIVE_TTL
+)
+
+# Запросы get_chat_member, которые уже выполняются: (channel, user_id) -> задача
+_in_flight: dict[tuple[str, int], asyncio.Task] = {}
+
+
+async def _request_membership(bot: Bot, channel: str, user_id: int) -> bool | None:
+    """Ответ API с записью в кэш; None — проверить не удалось"""
+    try:
+        member = await asyncio.wait_for(
+            bot.get_chat_member(channel, user_id),
+            timeout=MEMBERSHIP_CHECK_TIMEOUT
+        )
+    except Exception as e:
+        metrics.inc("membership_check_errors")
+        logger.warning(f"Membership check failed for {user_id} in {channel}: {e!r}")
+        return None
+    is_member = is_member_status(member)
+    membership_cache.set(channel, user_id, is_member)
+    return is_member
+
+
+async def _fetch_membership(bot: Bot, channel: str, user_id: int) -> bool:
+    is_member = await _request_membership(bot, channel, user_id)
+    if is_member is None:
+        # Таймаут или ошибка API — это не ответ "не подписан", а неизвестность
+        return bool(membership_cache.get_stale(channel, user_id))
+    return is_member
+
+
+async def is_channel_member(bot: Bot, channel: str, user_id: int) -> bool:
+    """Проверка подписки: индекс, кэш, затем один общий запрос на всех ожидающих"""
+    indexed = membership_index.get(channel, user_id)
+    if indexed is not None:
+        metrics.inc("membership_index_hits")
+        return indexed
+    cached = membership_cache.get(channel, user_id)
+    if cached is not None:
+        return cached
+    key = (channel, user_id)
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_membership(bot, channel, user_id))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    else:
+        metrics.inc("membership_checks_shared")
+    # shield: отмена одного ожидающего не должна отменять запрос для остальных
+    return await asyncio.shield(task)
+
+
+async def get_missing_channels(bot: Bot, user_id: int, channels: list[str]) -> list[str]:
+    """Каналы, на которые пользователь не подписан (все проверки параллельно)"""
+    results = await asyncio.gather(
+        *(is_channel_member(bot, channel, user_id) for channel in channels)
+    )
+    return [channel for channel, ok in zip(channels, results) if not ok]
+
+
+async def refresh_missing_channels(bot: Bot, session: AsyncSession, user_id: int, channels: list[str]) -> list[str]:
+    """Как get_missing_channels, но мимо индекса и кэша: только свежие ответы API.
+
+    Полученные ответы записываются в индекс, чтобы исправить запись,
+    пропущенную из-за потерянного апдейта chat_member.
+    """
+    results = await asyncio.gather(
+        *(_request_membership(bot, channel, user_id) for channel in channels)
+    )
+    missing = []
+    for channel, is_member in zip(channels, results):
+        if is_member is None:
+            is_member = bool(membership_cache.get_stale(channel, user_id))
+        elif is_member != membership_index.get(channel, user_id):
+            await membership_index.update(session, channel, user_id, is_member)
+        if not is_member:
+            missing.append(channel)
+    return missing
+
+
+async def check_bot_admin(bot: Bot, channels: list[str]) -> None:
+    """Предупреждение, если бот не админ канала и не получит апдейты chat_member"""
+    me = await bot.me()
+    for channel in channels:
+        try:
+            member = await bot.get_chat_member(channel, me.id)
+        except Exception as e:
+            logger.warning(f"Cannot check bot rights in {channel}: {e!r}")
+            continue
+        if member.status not in ("administrator", "creator"):
+            logger.warning(
+                f"Bot is not an admin of {channel}: membership index will not be updated, "
+                "subscriptions there are checked on demand"
+            )
@@ -0,0 +1,39 @@
+from collections import Counter
+from typing import Callable
+
+# Простые внутрипроцессные счётчики (хиты кэшей, пропущенные запросы и т.п.)
+counters: Counter = Counter()
+# Текущие значения, которые вычисляются при чтении (например, длина очереди)
+gauges: dict[str, Callable[[], float]] = {}
+# Длительности: name -> [количество, сумма, максимум]
+timings: dict[str, list[float]] = {}
+
+
+def inc(name: str, value: int = 1) -> None:
+    """Увеличение счётчика"""
+    counters[name] += value
+
+
+def register_gauge(name: str, getter: Callable[[], float]) -> None:
+    """Регистрация значения, которое читается в момент снимка"""
+    gauges[name] = getter
+
+
+def observe(name: str, value: float) -> None:
+    """Учёт длительности (секунды)"""
+    stat = timings.setdefault(name, [0, 0.0, 0.0])
+    stat[0] += 1
+    stat[1] += value
+    stat[2] = max(stat[2], value)
+
+
+def snapshot() -> dict:
+    """Текущие значения всех метрик"""
+    data = dict(counters)
+    for name, getter in gauges.items():
+        data[name] = getter()
+    for name, (count, total, peak) in timings.items():
+        data[f"{name}_count"] = int(count)
+        data[f"{name}_avg"] = round(total / count, 4) if count else 0
+        data[f"{name}_max"] = round(peak, 4)
+    return data
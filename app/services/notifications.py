@@ -1,12 +1,29 @@
-from aiogram import Bot
-from app.database.db import async_session_maker, User, UserRole
+from app.database.db import User, UserRole, TeamStatus
+from app.database.crud import add_notification
+from app.keyboards.user import captain_groups_url_kb
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-async def notify_super_admins(bot: Bot, text: str, session: AsyncSession, reply_markup=None):
-    """Уведомление супер-админов"""
+async def notify_super_admins(text: str, session: AsyncSession, reply_markup=None):
+    """Уведомление супер-админов через outbox (отправится после коммита)"""
     super_admins = await session.scalars(
-        select(User).where(User.role == UserRole.SUPER_ADMIN)
+        select(User.telegram_id).where(User.role == UserRole.SUPER_ADMIN)
     )
-    for admin in super_admins:
-        await bot.send_message(admin.telegram_id, text, reply_markup=reply_markup)
\ No newline at end of file
+    for telegram_id in super_admins:
+        add_notification(session, telegram_id, text, reply_markup)
+
+def notify_team_status(session: AsyncSession, captain_tg_id: int, team_name: str, status: TeamStatus):
+    """Уведомление капитана о решении по заявке (через outbox)"""
+    if status == TeamStatus.APPROVED:
+        add_notification(
+            session,
+            captain_tg_id,
+            f"🎉 Ваша команда '{team_name}' одобрена для участия в турнире! Вы приглашены в группу капитанов команд",
+            reply_markup=captain_groups_url_kb()
+        )
+    else:
+        add_notification(
+            session,
+            captain_tg_id,
+            f"❌ Ваша команда '{team_name}' отклонена организатором турнира."
+        )
\ No newline at end of file
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramServerError
+from dotenv import load_dotenv
+from app.services import metrics
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Глобальный лимит Bot API ~30 сообщений в секунду
+OUTBOUND_RATE = float(os.getenv("OUTBOUND_RATE", "30"))
+# Не чаще одного сообщения в секунду в один чат
+OUTBOUND_CHAT_INTERVAL = float(os.getenv("OUTBOUND_CHAT_INTERVAL", "1"))
+OUTBOUND_CONCURRENCY = int(os.getenv("OUTBOUND_CONCURRENCY", "8"))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "5"))
+# Пауза перед повтором после сетевой ошибки или 5xx, с; удваивается с каждой попыткой
+OUTBOUND_RETRY_DELAY = float(os.getenv("OUTBOUND_RETRY_DELAY", "1"))
+
+
+@dataclass
+class _Outgoing:
+    chat_id: int
+    text: str
+    kwargs: dict
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    paced: bool = False  # слот в чате уже занят (выпущено из очереди чата)
+
+
+class OutboundQueue:
+    """Фоновая отправка сообщений с ограничением скорости.
+
+    Обработчики только ставят сообщение в очередь и сразу возвращаются.
+    """
+
+    def __init__(self, rate: float, chat_interval: float, concurrency: int, max_attempts: int, retry_delay: float):
+        self.rate = rate
+        self.chat_interval = chat_interval
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.bot: Bot | None = None
+        self._queue: asyncio.Queue[_Outgoing] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        # Token bucket
+        self._tokens = rate
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0  # после TelegramRetryAfter
+        self._bucket_lock = asyncio.Lock()
+        # chat_id -> время, раньше которого в чат писать нельзя
+        self._chat_next: dict[int, float] = {}
+        # Сообщения, ждущие своей очереди в чат (по порядку), — ждут без воркеров
+        self._waiting: dict[int, deque[_Outgoing]] = {}
+        # Отложенные выпуски и повторы
+        self._timers: set[asyncio.TimerHandle] = set()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() + sum(len(waiting) for waiting in self._waiting.values())
+
+    def start(self, bot: Bot) -> None:
+        self.bot = bot
+        for _ in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        for handle in self._timers:
+            handle.cancel()
+        self._timers.clear()
+        self._waiting.clear()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        """Постановка сообщения в очередь.
+
+        Future завершается None при успешной доставке или исключением-причиной
+        (в качестве результата, а не raise), если сообщение доставить не удалось.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Outgoing(chat_id, text, kwargs, future))
+        metrics.inc("outbound_enqueued")
+        return future
+
+    async def _acquire_token(self) -> None:
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.rate, self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _call_later(self, delay: float, callback, *args) -> None:
+        def run():
+            self._timers.discard(handle)
+            callback(*args)
+        handle = asyncio.get_running_loop().call_later(delay, run)
+        self._timers.add(handle)
+
+    def _reserve_chat(self, chat_id: int) -> bool:
+        """Занять слот отправки в чат, если он свободен и очереди чата нет"""
+        now = time.monotonic()
+        if chat_id in self._waiting or self._chat_next.get(chat_id, 0.0) > now:
+            return False
+        self._chat_next[chat_id] = now + self.chat_interval
+        if len(self._chat_next) > 10000:
+            self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+        return True
+
+    def _defer(self, item: _Outgoing) -> None:
+        """Сообщение в очередь чата; воркер сразу берёт следующее"""
+        waiting = self._waiting.get(item.chat_id)
+        if waiting is None:
+            waiting = self._waiting[item.chat_id] = deque()
+            self._schedule_release(item.chat_id)
+        waiting.append(item)
+
+    def _schedule_release(self, chat_id: int) -> None:
+        delay = max(0.0, self._chat_next.get(chat_id, 0.0) - time.monotonic())
+        self._call_later(delay, self._release, chat_id)
+
+    def _release(self, chat_id: int) -> None:
+        """Следующее сообщение чата — в общую очередь, со слотом в чате"""
+        waiting = self._waiting[chat_id]
+        item = waiting.popleft()
+        self._chat_next[chat_id] = time.monotonic() + self.chat_interval
+        item.paced = True
+        self._queue.put_nowait(item)
+        if waiting:
+            self._schedule_release(chat_id)
+        else:
+            del self._waiting[chat_id]
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._deliver(item)
+            except Exception as e:
+                logger.error(f"Outbound worker error: {e}", exc_info=True)
+                if not item.future.done():
+                    item.future.set_result(e)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item: _Outgoing) -> None:
+        # Воркер ждёт только общий лимит; чат, в который писать рано, не задерживает остальные
+        if not item.paced and not self._reserve_chat(item.chat_id):
+            self._defer(item)
+            return
+        item.paced = False
+        await self._acquire_token()
+        item.attempts += 1
+        try:
+            await self.bot.send_message(item.chat_id, item.text, **item.kwargs)
+        except TelegramRetryAfter as e:
+            metrics.inc("outbound_retry_after")
+            logger.warning(f"Flood control, pause for {e.retry_after}s")
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            self._retry_or_fail(item, e)
+            return
+        except (TelegramNetworkError, TelegramServerError) as e:
+            metrics.inc("outbound_transient_errors")
+            self._retry_or_fail(item, e, self.retry_delay * 2 ** (item.attempts - 1))
+            return
+        except Exception as e:
+            # Бот заблокирован, чат не найден и т.п. — повтор не поможет
+            metrics.inc("outbound_failed")
+            logger.warning(f"Cannot send message to {item.chat_id}: {e}")
+            item.future.set_result(e)
+            return
+        metrics.inc("outbound_sent")
+        metrics.observe("outbound_latency", time.monotonic() - item.enqueued_at)
+        item.future.set_result(None)
+
+    def _retry_or_fail(self, item: _Outgoing, error: Exception, delay: float = 0) -> None:
+        if item.attempts >= self.max_attempts:
+            metrics.inc("outbound_failed")
+            logger.warning(f"Giving up on message to {item.chat_id}: {error}")
+            item.future.set_result(error)
+        elif delay <= 0:
+            self._queue.put_nowait(item)
+        else:
+            self._call_later(delay, self._queue.put_nowait, item)
+
+
+outbound = OutboundQueue(
+    OUTBOUND_RATE,
+    OUTBOUND_CHAT_INTERVAL,
+    OUTBOUND_CONCURRENCY,
+    OUTBOUND_MAX_ATTEMPTS,
+    OUTBOUND_RETRY_DELAY
+)
+metrics.register_gauge("outbound_queue_depth", lambda: outbound.depth)
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup
+from dotenv import load_dotenv
+from sqlalchemy import event, select, delete
+from sqlalchemy.orm import Session
+from app.database.db import OutboxMessage, OutboxStatus, async_session_maker
+from app.services import metrics
+from app.services.outbound import outbound
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_INTERVAL = float(os.getenv("OUTBOX_INTERVAL", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+
+class OutboxDrainer:
+    """Доставка уведомлений из таблицы outbox пачками через очередь отправки"""
+
+    def __init__(self, batch_size: int, interval: float, max_attempts: int):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self) -> None:
+        """Немедленная доставка (вызывается после коммита с новыми уведомлениями)"""
+        self._wake.set()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                delivered = await self.drain_once()
+            except Exception as e:
+                logger.error(f"Outbox drain error: {e}", exc_info=True)
+                delivered = 0
+            # Полная пачка доставлена — скорее всего, есть ещё
+            if delivered >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def drain_once(self) -> int:
+        # Отправляем без открытой транзакции, чтобы не держать блокировку БД
+        async with async_session_maker() as session:
+            rows = list(await session.scalars(
+                select(OutboxMessage)
+                .where(OutboxMessage.status == OutboxStatus.PENDING)
+                .order_by(OutboxMessage.id)
+                .limit(self.batch_size)
+            ))
+        if not rows:
+            return 0
+
+        results = await asyncio.gather(*(
+            outbound.send_message(
+                row.chat_id,
+                row.text,
+                reply_markup=(
+                    InlineKeyboardMarkup.model_validate_json(row.reply_markup)
+                    if row.reply_markup else None
+                )
+            )
+            for row in rows
+        ))
+
+        delivered = [row.id for row, error in zip(rows, results) if error is None]
+        async with async_session_maker() as session:
+            for row, error in zip(rows, results):
+                if error is None:
+                    continue
+                row = await session.merge(row, load=False)
+                row.attempts += 1
+                row.last_error = str(error)[:200]
+                permanent = isinstance(error, (TelegramForbiddenError, TelegramBadRequest))
+                if permanent or row.attempts >= self.max_attempts:
+                    row.status = OutboxStatus.DEAD
+                    metrics.inc("outbox_dead")
+                    logger.warning(f"Outbox message {row.id} moved to dead letters: {error}")
+            if delivered:
+                await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(delivered)))
+            await session.commit()
+        metrics.inc("outbox_delivered", len(delivered))
+        return len(delivered)
+
+
+outbox_drainer = OutboxDrainer(OUTBOX_BATCH_SIZE, OUTBOX_INTERVAL, OUTBOX_MAX_ATTEMPTS)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_drainer(session: Session) -> None:
+    if session.info.pop("outbox_dirty", False):
+        outbox_drainer.wake()
@@ -0,0 +1,189 @@
+import logging
+from collections import Counter
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.database.db import StatCounter, Team, Tournament, User
+
+logger = logging.getLogger(__name__)
+
+# Счётчики по турнирам: по одному на турнир, на общий экран статистики не читаются
+TOURNAMENT_TEAMS_PREFIX = "teams:tournament:"
+
+
+def _value(status) -> str:
+    return getattr(status, "value", status)
+
+
+def tournament_keys(status, is_active: bool, game_id: int | None = None) -> list[str]:
+    """Счётчики, в которые входит турнир"""
+    keys = ["tournaments", f"tournaments:{_value(status)}"]
+    if is_active:
+        keys.append("tournaments:active")
+    if game_id is not None:
+        keys.append(f"tournaments:game:{game_id}")
+    return keys
+
+
+def team_keys(status, tournament_id: int, game_id: int | None = None) -> list[str]:
+    """Счётчики, в которые входит команда"""
+    keys = [
+        "teams",
+        f"teams:{_value(status)}",
+        f"{TOURNAMENT_TEAMS_PREFIX}{tournament_id}",
+        f"{TOURNAMENT_TEAMS_PREFIX}{tournament_id}:{_value(status)}",
+    ]
+    if game_id is not None:
+        keys.append(f"teams:game:{game_id}")
+    return keys
+
+
+def change_deltas(old_keys: list[str], new_keys: list[str]) -> Counter:
+    """Изменения счётчиков, когда объект переходит из одного набора в другой"""
+    deltas = Counter(new_keys)
+    deltas.subtract(old_keys)
+    return deltas
+
+
+def field_change_deltas(obj, field: str, old, new) -> Counter:
+    """Изменения счётчиков при смене status/is_active турнира или статуса команды"""
+    if isinstance(obj, Tournament) and field in ("status", "is_active"):
+        state = {"status": obj.status, "is_active": obj.is_active}
+        return change_deltas(
+            tournament_keys(**{**state, field: old}),
+            tournament_keys(**{**state, field: new})
+        )
+    if isinstance(obj, Team) and field == "status":
+        return change_deltas(team_keys(old, obj.tournament_id), team_keys(new, obj.tournament_id))
+    return Counter()
+
+
+def apply_deltas(conn: Connection, deltas: Counter) -> None:
+    """Атомарное прибавление к счётчикам (upsert) в текущей транзакции"""
+    rows = [{"name": name, "value": value} for name, value in deltas.items() if value]
+    if not rows:
+        return
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite_insert if dialect == "sqlite" else pg_insert)(StatCounter)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[StatCounter.name],
+                set_={"value": StatCounter.value + stmt.excluded.value}
+            ),
+            rows
+        )
+    else:
+        for row in rows:
+            updated = conn.execute(
+                update(StatCounter)
+                .where(StatCounter.name == row["name"])
+                .values(value=StatCounter.value + row["value"])
+            ).rowcount
+            if not updated:
+                conn.execute(insert(StatCounter).values(**row))
+    # Обнулившиеся счётчики (например, удалённого турнира) не храним
+    conn.execute(delete(StatCounter).where(
+        StatCounter.name.in_([row["name"] for row in rows]),
+        StatCounter.value == 0
+    ))
+
+
+async def bump(session: AsyncSession, deltas: Counter) -> None:
+    """apply_deltas для изменений, сделанных в обход ORM (UPDATE ... RETURNING)"""
+    if any(deltas.values()):
+        conn = await session.connection()
+        await conn.run_sync(apply_deltas, deltas)
+
+
+def _game_id(session: Session, conn: Connection, tournament_id: int) -> int | None:
+    tournament = session.identity_map.get(session.identity_key(Tournament, tournament_id))
+    if tournament is not None:
+        return tournament.game_id
+    return conn.execute(select(Tournament.game_id).where(Tournament.id == tournament_id)).scalar()
+
+
+def _object_keys(session: Session, conn: Connection, obj) -> list[str]:
+    if isinstance(obj, User):
+        return ["users"]
+    if isinstance(obj, Tournament):
+        return tournament_keys(obj.status, obj.is_active, obj.game_id)
+    if isinstance(obj, Team):
+        return team_keys(obj.status, obj.tournament_id, _game_id(session, conn, obj.tournament_id))
+    return []
+
+
+def _old_value(obj, field: str):
+    history = inspect(obj).attrs[field].history
+    return history.deleted[0] if history.deleted else getattr(obj, field)
+
+
+@event.listens_for(Session, "after_flush")
+def _count_flushed(session: Session, flush_context) -> None:
+    """Счётчики для вставок, удалений и смены статуса через ORM"""
+    counted = (User, Tournament, Team)
+    if not any(isinstance(obj, counted) for obj in (*session.new, *session.deleted, *session.dirty)):
+        return
+    conn = session.connection()
+    deltas = Counter()
+    for obj in session.new:
+        deltas.update(_object_keys(session, conn, obj))
+    for obj in session.deleted:
+        deltas.subtract(_object_keys(session, conn, obj))
+    for obj in session.dirty:
+        if isinstance(obj, Tournament):
+            deltas.update(change_deltas(
+                tournament_keys(_old_value(obj, "status"), _old_value(obj, "is_active")),
+                tournament_keys(obj.status, obj.is_active)
+            ))
+        elif isinstance(obj, Team):
+            deltas.update(change_deltas(
+                team_keys(_old_value(obj, "status"), obj.tournament_id),
+                team_keys(obj.status, obj.tournament_id)
+            ))
+    apply_deltas(conn, deltas)
+
+
+def recompute_counters(conn: Connection) -> int:
+    """Пересчёт всех счётчиков по таблицам (исправление расхождений); возвращает число счётчиков"""
+    deltas = Counter()
+    deltas["users"] = conn.execute(select(func.count(User.id))).scalar()
+    for status, is_active, game_id, count in conn.execute(
+        select(Tournament.status, Tournament.is_active, Tournament.game_id, func.count(Tournament.id))
+        .group_by(Tournament.status, Tournament.is_active, Tournament.game_id)
+    ):
+        for key in tournament_keys(status, is_active, game_id):
+            deltas[key] += count
+    for status, tournament_id, game_id, count in conn.execute(
+        select(Team.status, Team.tournament_id, Tournament.game_id, func.count(Team.id))
+        .outerjoin(Tournament, Tournament.id == Team.tournament_id)
+        .group_by(Team.status, Team.tournament_id, Tournament.game_id)
+    ):
+        for key in team_keys(status, tournament_id, game_id):
+            deltas[key] += count
+    conn.execute(delete(StatCounter))
+    apply_deltas(conn, deltas)
+    logger.info(f"Statistics counters recomputed: {len(deltas)}")
+    return len(deltas)
+
+
+async def read_overview(session: AsyncSession) -> dict[str, int]:
+    """Все счётчики, кроме потурнирных, одним запросом"""
+    rows = await session.execute(
+        select(StatCounter.name, StatCounter.value)
+        .where(StatCounter.name.not_like(f"{TOURNAMENT_TEAMS_PREFIX}%"))
+    )
+    return dict(rows.all())
+
+
+async def read_tournament_teams(session: AsyncSession, tournament_id: int) -> dict[str, int]:
+    """Счётчики команд турнира: {"": всего, "approved": ..., ...}"""
+    prefix = f"{TOURNAMENT_TEAMS_PREFIX}{tournament_id}"
+    rows = await session.execute(
+        select(StatCounter.name, StatCounter.value)
+        .where((StatCounter.name == prefix) | StatCounter.name.like(f"{prefix}:%"))
+    )
+    return {name[len(prefix) + 1:]: value for name, value in rows}
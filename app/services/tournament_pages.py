@@ -0,0 +1,95 @@
+import os
+from typing import NamedTuple
+from aiogram.types import InlineKeyboardMarkup
+from dotenv import load_dotenv
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.database import crud
+from app.database.db import Tournament, TournamentStatus
+from app.keyboards.user import tournaments_page_kb
+from app.services import metrics
+
+load_dotenv()
+
+TOURNAMENTS_PAGE_SIZE = int(os.getenv("TOURNAMENTS_PAGE_SIZE", "10"))
+
+
+class TournamentPage(NamedTuple):
+    number: int
+    last_id: int  # курсор следующей страницы
+    has_next: bool
+    markup: InlineKeyboardMarkup
+
+
+class TournamentPages:
+    """Готовые страницы списка турниров по формату: (format_id, номер) -> страница.
+
+    Страницы строятся keyset-запросами (id > курсора) по индексу
+    ix_tournaments_format_active_status; курсор страницы N — последний id
+    страницы N - 1, поэтому в callback достаточно номера страницы.
+    """
+
+    def __init__(self, page_size: int):
+        self.page_size = page_size
+        self._pages: dict[int, list[TournamentPage]] = {}
+        self._versions: dict[int, int] = {}  # растёт при каждой инвалидации формата
+
+    def invalidate(self, format_id: int) -> None:
+        self._pages.pop(format_id, None)
+        self._versions[format_id] = self._versions.get(format_id, 0) + 1
+
+    async def get(self, session: AsyncSession, format_id: int, number: int) -> TournamentPage | None:
+        """Страница с номером number (или последняя, если турниров стало меньше); None — турниров нет"""
+        pages = self._pages.get(format_id, [])
+        if number < len(pages):
+            metrics.inc("tournament_pages_hits")
+            return pages[number]
+        version = self._versions.get(format_id, 0)
+        # Недостающие страницы догружаем по цепочке курсоров от последней известной
+        pages = list(pages)
+        while len(pages) <= number and (not pages or pages[-1].has_next):
+            page = await self._load(session, format_id, len(pages), pages[-1].last_id if pages else None)
+            if page is None:
+                break
+            pages.append(page)
+        if version == self._versions.get(format_id, 0):
+            self._pages[format_id] = pages
+        return pages[min(number, len(pages) - 1)] if pages else None
+
+    async def _load(self, session: AsyncSession, format_id: int, number: int, after: int | None) -> TournamentPage | None:
+        metrics.inc("tournament_pages_misses")
+        page = await crud.keyset_page(
+            session,
+            select(Tournament.id, Tournament.name).where(
+                Tournament.format_id == format_id,
+                Tournament.is_active == True,
+                Tournament.status == TournamentStatus.APPROVED
+            ),
+            Tournament.id,
+            after=after,
+            limit=self.page_size
+        )
+        if not page.rows:
+            return None
+        return TournamentPage(
+            number,
+            page.rows[-1].id,
+            page.has_next,
+            tournaments_page_kb(format_id, page.rows, number, page.has_next)
+        )
+
+
+tournament_pages = TournamentPages(TOURNAMENTS_PAGE_SIZE)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_pages(session: Session) -> None:
+    # Форматы отмечает crud.mark_tournaments_changed
+    for format_id in session.info.pop("tournament_formats", ()):
+        tournament_pages.invalidate(format_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_page_changes(session: Session) -> None:
+    session.info.pop("tournament_formats", None)
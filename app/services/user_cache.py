@@ -0,0 +1,69 @@
+import os
+from collections import OrderedDict
+from typing import NamedTuple
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.db import User, UserRole
+from app.services import metrics
+
+load_dotenv()
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))
+
+
+class CachedUser(NamedTuple):
+    """Минимальный снимок пользователя для проверок ролей"""
+    id: int
+    telegram_id: int
+    role: UserRole
+    username: str | None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role in (UserRole.ADMIN, UserRole.SUPER_ADMIN)
+
+
+_MISSING = object()
+
+
+class UserCache:
+    """Процессный LRU: telegram_id -> CachedUser (None — пользователя нет в БД)"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[int, CachedUser | None] = OrderedDict()
+
+    def get(self, telegram_id: int):
+        value = self._data.get(telegram_id, _MISSING)
+        if value is not _MISSING:
+            self._data.move_to_end(telegram_id)
+        return value
+
+    def put(self, telegram_id: int, user: CachedUser | None) -> None:
+        self._data[telegram_id] = user
+        self._data.move_to_end(telegram_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, telegram_id: int) -> None:
+        self._data.pop(telegram_id, None)
+
+
+user_cache = UserCache(USER_CACHE_SIZE)
+
+
+async def resolve_user(session: AsyncSession, telegram_id: int) -> CachedUser | None:
+    """Пользователь по telegram_id: из кэша или одним запросом к БД"""
+    cached = user_cache.get(telegram_id)
+    if cached is not _MISSING:
+        metrics.inc("user_cache_hits")
+        return cached
+    metrics.inc("user_cache_misses")
+    row = (await session.execute(
+        select(User.id, User.telegram_id, User.role, User.username)
+        .where(User.telegram_id == telegram_id)
+    )).first()
+    user = CachedUser(*row) if row else None
+    user_cache.put(telegram_id, user)
+    return user
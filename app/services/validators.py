@@ -1,14 +1,13 @@
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.database.db import Game, User, UserRole  # Убедитесь, что модель Game существует
+from app.database.db import Game  # Убедитесь, что модель Game существует
+from app.services.user_cache import resolve_user
 
     
 async def is_admin(user_id: int, session: AsyncSession) -> bool:
     """Проверка прав администратора через роль"""
-    user = await session.scalar(
-        select(User).where(User.telegram_id == user_id))
-    return user.role in [UserRole.ADMIN, UserRole.SUPER_ADMIN] if user else False
+    user = await resolve_user(session, user_id)
+    return user.is_admin if user else False
 
 async def validate_team_players(
     session: AsyncSession,
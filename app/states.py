@@ -19,6 +19,10 @@ class RegisterTeam(StatesGroup):
 class AdminActions(StatesGroup):
     WAITING_ADMIN_USERNAME = State()  # Замените WAITING_ADMIN_ID на это
     
+class TournamentBroadcast(StatesGroup):
+    TEXT = State()
+    CONFIRM = State()
+    
 class EditTeam(StatesGroup):
     NAME = State()
     LOGO = State()
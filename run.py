@@ -6,31 +6,79 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
-from app.handlers import common, user, admin, super_admin
-from app.database.db import create_db, async_session_maker
-from app.middleware import DatabaseMiddleware, ErrorHandlerMiddleware, SubscriptionMiddleware
+from app.handlers import common, user, admin, super_admin, channels
+from app.database.db import create_db, async_session_maker, optimize_database, run_db_optimizer, DB_OPTIMIZE_INTERVAL
+from app.database.writer import db_writer
+from app.middleware import (
+    DatabaseMiddleware,
+    ErrorHandlerMiddleware,
+    SubscriptionMiddleware,
+    CurrentUserMiddleware,
+    CallbackDedupMiddleware,
+    REQUIRED_CHANNELS
+)
+from app.services.membership import membership_index, check_bot_admin
+from app.services.outbound import outbound
+from app.services.outbox import outbox_drainer
+from app.services.broadcast import resume_broadcasts
+from app.services.catalog import catalog
+from app.services.file_handling import MEDIA_STORAGE_MODE, MEDIA_MATERIALIZE_INTERVAL, run_media_materializer
 from logging.handlers import RotatingFileHandler
 
 load_dotenv()
 
 async def main():
     await create_db()
+    await catalog.load()
+    async with async_session_maker() as session:
+        await membership_index.load(session, REQUIRED_CHANNELS)
     
     bot = Bot(token=os.getenv("BOT_TOKEN"))
+    await check_bot_admin(bot, REQUIRED_CHANNELS)
     dp = Dispatcher()
 
     # Middleware
     dp.update.middleware(DatabaseMiddleware(async_session_maker))
     dp.update.middleware(ErrorHandlerMiddleware())
-    dp.message.middleware(SubscriptionMiddleware())
-    dp.callback_query.middleware(SubscriptionMiddleware())
+    # Дубли нажатий отсекаем до всех проверок и обращений к БД
+    dp.callback_query.outer_middleware(CallbackDedupMiddleware())
+    # Подписка проверяется до загрузки пользователя: отклонённый апдейт не ходит в БД
+    dp.message.outer_middleware(SubscriptionMiddleware())
+    dp.callback_query.outer_middleware(SubscriptionMiddleware())
+    # outer — чтобы current_user был доступен фильтрам
+    dp.message.outer_middleware(CurrentUserMiddleware())
+    dp.callback_query.outer_middleware(CurrentUserMiddleware())
     # Роутеры
     dp.include_router(common.router)
     dp.include_router(user.router)
     dp.include_router(admin.router)
     dp.include_router(super_admin.router)
+    dp.include_router(channels.router)
     
-    await dp.start_polling(bot)
+    materializer = None
+    if MEDIA_STORAGE_MODE == "deferred" and MEDIA_MATERIALIZE_INTERVAL > 0:
+        materializer = asyncio.create_task(run_media_materializer(bot))
+    
+    outbound.start(bot)
+    db_writer.start()
+    outbox_drainer.start()
+    optimizer = asyncio.create_task(run_db_optimizer()) if DB_OPTIMIZE_INTERVAL > 0 else None
+    await resume_broadcasts(bot)
+    try:
+        # chat_member не приходит без явного allowed_updates
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        # Сначала останавливаем тех, кто отправляет через очередь
+        await outbox_drainer.stop()
+        await outbound.stop()
+        await db_writer.stop()
+        if materializer:
+            materializer.cancel()
+            await asyncio.gather(materializer, return_exceptions=True)
+        if optimizer:
+            optimizer.cancel()
+            await asyncio.gather(optimizer, return_exceptions=True)
+        await optimize_database()
 
 if __name__ == "__main__":
     logging.basicConfig(